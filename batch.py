@@ -0,0 +1,192 @@
+import argparse
+import contextlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import main
+
+__author__ = "Jack Ashton"
+
+POLICIES = {"scripted": 40, "random": 1}  # ticks each action of the ScriptedPlayer lasts for, random changes every tick
+
+
+class Distribution:  # counts values into fixed width bins so memory does not grow with the number of matches
+    def __init__(self, bin_width):
+        self.bin_width = bin_width
+        self.bins = {}  # lowest value of a bin: number of values in it
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value):
+        bin_start = value // self.bin_width * self.bin_width
+        self.bins[bin_start] = self.bins.get(bin_start, 0) + 1
+        self.count += 1
+        self.total += value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    def percentile(self, fraction):  # lowest value of the bin the percentile falls in
+        rank = fraction * self.count
+        seen = 0
+        for bin_start in sorted(self.bins):
+            seen += self.bins[bin_start]
+            if seen >= rank:
+                return bin_start
+        return self.maximum
+
+    def summary(self):
+        return {"mean": self.total / self.count if self.count > 0 else 0, "min": self.minimum, "max": self.maximum,
+                "p10": self.percentile(0.1), "p50": self.percentile(0.5), "p90": self.percentile(0.9),
+                "bin_width": self.bin_width, "bins": {str(bin_start): self.bins[bin_start]
+                                                      for bin_start in sorted(self.bins)}}
+
+
+class MatchStats:  # distributions of the results of every match played at a difficulty with a policy
+    def __init__(self):
+        self.matches = 0
+        self.deaths = 0  # matches that ended with the player dead rather than at the tick limit
+        self.score = Distribution(25)  # scores are always a multiple of 25
+        self.survival_ticks = Distribution(100)
+        self.damage_taken = Distribution(5)
+        self.wave = Distribution(1)  # wave reached in horde mode
+
+    def add(self, result):
+        self.matches += 1
+        self.deaths += result["died"]
+        self.score.add(result["score"])
+        self.survival_ticks.add(result["survival_ticks"])
+        self.damage_taken.add(result["damage_taken"])
+        if "wave" in result:
+            self.wave.add(result["wave"])
+
+    def summary(self):
+        summary = {"matches": self.matches, "deaths": self.deaths, "score": self.score.summary(),
+                   "survival_ticks": self.survival_ticks.summary(), "damage_taken": self.damage_taken.summary()}
+        if self.wave.count > 0:
+            summary["wave"] = self.wave.summary()
+        return summary
+
+
+def play_match(match):  # plays one headless round from the start until the player dies or the tick limit
+    match_id, difficulty, policy, seed, max_ticks, enemy_count, horde = match
+    game = main.Main(seed=seed, enemy_count=enemy_count, horde=horde, quiet=True)
+    scripted_player = main.ScriptedPlayer(seed, action_length=POLICIES[policy])
+    game.start_round(difficulty)
+    while game.player.health > 0 and game.ticks_played < max_ticks:
+        scripted_player.press_keys(game.player, game.game.ticks)
+        game.game_state()
+    result = {"match": match_id, "difficulty": difficulty, "policy": policy, "seed": seed, "score": game.game.score,
+              "survival_ticks": game.ticks_played, "damage_taken": game.player.default_health - game.player.health,
+              "died": game.player.health <= 0}
+    if horde is True:
+        result["wave"] = game.game.horde.wave_number
+    return result
+
+
+def play_matches(matches):  # plays a chunk of matches in a worker
+    return [play_match(match) for match in matches]
+
+
+def create_matches(difficulties, policies, matches, seed, max_ticks, enemy_count, horde):
+    # every difficulty and policy plays the same seeds so their results can be compared match for match
+    match_id = 0
+    for difficulty in difficulties:
+        for policy in policies:
+            for i in range(matches):
+                yield match_id, difficulty, policy, seed + i, max_ticks, enemy_count, horde
+                match_id += 1
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(itertools.islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, size))
+
+
+def bounded(iterable, slots):  # hands out items only while a slot is free, each result handed back frees one
+    for item in iterable:
+        slots.acquire()
+        yield item
+
+
+def run_batch(difficulties, policies, matches, seed, max_ticks, enemy_count, horde, workers, chunk_size, output_path):
+    # plays every match across a pool of processes, each result is written to output_path as soon as it arrives
+    stats = {}
+    total_ticks = 0
+    played = 0
+    match_count = len(difficulties) * len(policies) * matches
+    start_time = time.perf_counter()
+    match_chunks = chunks(create_matches(difficulties, policies, matches, seed, max_ticks, enemy_count, horde),
+                          chunk_size)
+    # the pool takes a new chunk as soon as a result comes back, so workers are never left waiting on the others while
+    # only a few chunks for each worker are pending at a time and the matches do not fill memory
+    pending = threading.BoundedSemaphore(max(1, workers) * 4)
+    with open(output_path, "w") as output_file, contextlib.ExitStack() as stack:
+        if workers > 1:
+            pool = stack.enter_context(multiprocessing.Pool(workers))
+            results = pool.imap_unordered(play_matches, bounded(match_chunks, pending))
+        else:  # plays in this process, used to measure the throughput of a single core
+            results = map(play_matches, match_chunks)
+        for chunk_results in results:
+            if workers > 1:
+                pending.release()
+            for result in chunk_results:
+                output_file.write(json.dumps(result) + "\n")
+                key = (result["difficulty"], result["policy"])
+                if key not in stats:
+                    stats[key] = MatchStats()
+                stats[key].add(result)
+                total_ticks += result["survival_ticks"]
+                played += 1
+            print("\r{}/{} MATCHES".format(played, match_count), end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    run_time = time.perf_counter() - start_time
+    return {"seed": seed, "matches_per_scenario": matches, "max_ticks": max_ticks, "enemy_count": enemy_count,
+            "horde": horde, "workers": workers, "seconds": run_time, "matches_per_second": played / run_time,
+            "ticks_per_second": total_ticks / run_time,
+            "scenarios": [dict(difficulty=difficulty, policy=policy, **stats[(difficulty, policy)].summary())
+                          for difficulty, policy in sorted(stats)]}
+
+
+def print_summary(summary):
+    print("{:>10} {:>8} {:>8} {:>7} {:>24} {:>24} {:>20}".format(
+        "DIFFICULTY", "POLICY", "MATCHES", "DEATHS", "SCORE p10/p50/p90", "SURVIVAL p10/p50/p90", "DAMAGE p10/p50/p90"))
+    for scenario in summary["scenarios"]:
+        print("{:>10} {:>8} {:>8} {:>7} {:>24} {:>24} {:>20}".format(
+            scenario["difficulty"], scenario["policy"], scenario["matches"], scenario["deaths"],
+            *("{p10}/{p50}/{p90}".format(**scenario[name]) for name in ("score", "survival_ticks", "damage_taken"))))
+    print("{} WORKERS, {:.1f}s, {:.1f} MATCHES/s, {:.0f} TICKS/s".format(
+        summary["workers"], summary["seconds"], summary["matches_per_second"], summary["ticks_per_second"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="plays seeded headless matches in parallel to balance the difficulty")
+    parser.add_argument("--difficulties", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--policies", nargs="+", choices=sorted(POLICIES), default=sorted(POLICIES),
+                        help="scripted holds each action for a while, random picks a new action every tick")
+    parser.add_argument("--matches", type=int, default=1000, help="matches for each difficulty and policy")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first match, each match uses the next seed")
+    parser.add_argument("--max-ticks", type=int, default=30000, help="ticks a match is stopped at if nobody has died")
+    parser.add_argument("--enemies", type=int, help="enemies in each match, the difficulty is used by default")
+    parser.add_argument("--horde", action="store_true", help="play horde mode, the difficulty sets the first wave")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes, 1 plays in this process")
+    parser.add_argument("--chunk-size", type=int, default=8, help="matches sent to a worker at a time")
+    parser.add_argument("--output", default="batch_results.jsonl", help="every match result, one json object a line")
+    parser.add_argument("--summary", default="batch_summary.json", help="json file the distributions are saved to")
+    arguments = parser.parse_args()
+    batch_summary = run_batch(arguments.difficulties, arguments.policies, arguments.matches, arguments.seed,
+                              arguments.max_ticks, arguments.enemies, arguments.horde, arguments.workers,
+                              arguments.chunk_size, arguments.output)
+    with open(arguments.summary, "w") as summary_file:
+        json.dump(batch_summary, summary_file, indent=1)
+    print_summary(batch_summary)
+    print("RESULTS SAVED TO {} AND {}".format(arguments.output, arguments.summary))
@@ -0,0 +1,567 @@
+from tkinter import *
+import argparse
+import contextlib
+import copy
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import batch
+import env
+import main
+
+__author__ = "Jack Ashton"
+
+
+def create_sprites(game, enemy_count):  # creates a player and enemies spread randomly across the canvas
+    player = game.create_player()
+    for i in range(enemy_count):
+        game.create_enemy(random.randint(1, 4))
+    for sprite in game.sprite_list:
+        sprite.display_sprite("right", image_index=0,
+                              x_coordinates=random.uniform(0, game.canvas_width - sprite.image_width))
+        sprite.visibility = True
+    return player
+
+
+def move_sprite(game, sprite):  # moves a sprite a step in a random direction and keeps it within the canvas
+    sprite.x = min(max(sprite.x + random.choice((-2.5, 2.5)), 0), game.canvas_width - sprite.image_width)
+
+
+def move_sprites(game):
+    for sprite in game.sprite_list:
+        move_sprite(game, sprite)
+
+
+def time_collision_grid(game, player, ticks):
+    for sprite in game.sprite_list:
+        game.collision_grid.update(sprite)
+    start = time.perf_counter()
+    for tick in range(ticks):
+        move_sprites(game)
+        for sprite in game.sprite_list:  # incremental update as in Game.update
+            game.collision_grid.update(sprite)
+        overlapping = game.find_overlapping(player)  # one query a tick as in Game.update_sprites
+        for enemy in game.sprite_list[1:]:
+            enemy in overlapping
+    return time.perf_counter() - start
+
+
+def time_linear_scan(game, player, ticks):  # checks every sprite against every enemy
+    start = time.perf_counter()
+    for tick in range(ticks):
+        move_sprites(game)
+        for enemy in game.sprite_list[1:]:
+            enemy_bbox = enemy.bbox
+            player in [sprite for sprite in game.sprite_list if sprite.overlaps(*enemy_bbox)]
+    return time.perf_counter() - start
+
+
+def time_canvas(game, player, ticks, canvas):  # the canvas path used before the collision grid
+    canvas.delete(ALL)
+    canvas.create_image(0, 0, image="", anchor=NW)  # background and health bars are searched by the canvas too
+    canvas.create_rectangle(10, 10, 502, 35, fill="red")
+    canvas.create_rectangle(10, 10, 502, 35, fill="green")
+    sprite_images = {}
+    for sprite in game.sprite_list:
+        x1, y1, x2, y2 = sprite.bbox
+        sprite_images[sprite] = canvas.create_rectangle(x1, y1, x2, y2)  # same extent as the sprite image
+    player_image = sprite_images[player]
+    start = time.perf_counter()
+    for tick in range(ticks):
+        for sprite in game.sprite_list:
+            previous_x = sprite.x
+            move_sprite(game, sprite)
+            canvas.move(sprite_images[sprite], sprite.x - previous_x, 0)
+        for enemy in game.sprite_list[1:]:
+            enemy_bbox = canvas.bbox(sprite_images[enemy])
+            player_image in canvas.find_overlapping(*enemy_bbox)
+    return time.perf_counter() - start
+
+
+def benchmark_collision(enemy_counts, ticks, seed):  # compares the ways of finding which sprites overlap the player
+    try:
+        window = Tk()
+        window.withdraw()
+        canvas = Canvas(window, width=1024, height=490)
+    except TclError:  # there is no display so the canvas path cannot be measured
+        canvas = None
+    print("{:>8} {:>14} {:>14} {:>14}".format("ENEMIES", "GRID (ms)", "SCAN (ms)", "CANVAS (ms)"))
+    for enemy_count in enemy_counts:
+        results = []
+        for timer in (time_collision_grid, time_linear_scan, time_canvas):
+            if timer is time_canvas and canvas is None:
+                results.append("no display")
+                continue
+            random.seed(seed)
+            game = main.Game(490, 1024, 100)
+            player = create_sprites(game, enemy_count)
+            if timer is time_canvas:
+                elapsed = timer(game, player, ticks, canvas)
+            else:
+                elapsed = timer(game, player, ticks)
+            results.append("{:.3f}".format(elapsed * 1000 / ticks))  # milliseconds per tick
+        print("{:>8} {:>14} {:>14} {:>14}".format(enemy_count, *results))
+
+
+def load_frames_by_index(name):  # the loader used before the asset cache, every frame opens and parses the gif again
+    frames = []
+    while True:
+        try:
+            frames.append(PhotoImage(file=os.path.join(main.IMAGE_DIRECTORY, "{}.gif".format(name)),
+                                     format="gif -index {}".format(len(frames))))
+        except TclError:
+            return frames
+
+
+def benchmark_assets(asset_list):  # compares the time taken to load the game assets with and without the asset cache
+    try:
+        window = Tk()
+        window.withdraw()
+    except TclError:
+        print("no display, tkinter images cannot be created")
+        return
+    with tempfile.TemporaryDirectory() as cache_directory:
+        asset_cache = main.AssetCache(cache_directory=cache_directory)
+        for label, load in (("BY INDEX", load_frames_by_index), ("CACHE COLD", asset_cache.load),
+                            ("CACHE WARM", asset_cache.load)):
+            start = time.perf_counter()
+            frame_count = sum(len(load(name)) for name in asset_list)
+            print("{:>12} {:>10.1f}ms {:>4} frames".format(label, (time.perf_counter() - start) * 1000, frame_count))
+    window.destroy()
+
+
+def benchmark_scale(asset_list, scales, max_scales):  # time to switch render scale with the scaled frame cache
+    try:
+        window = Tk()
+        window.withdraw()
+    except TclError:
+        print("no display, tkinter images cannot be created")
+        return
+    asset_cache = main.AssetCache()
+    frame_sets = [asset_cache.load(name) for name in asset_list]
+    scaled_frames = main.ScaledFrameCache(max_scales)
+    print("{:>6} {:>9} {:>10} {:>8} {:>7} {:>10} {:>8}".format(
+        "SCALE", "FRAMES", "TIME", "RESULT", "SCALES", "RESIDENT", "EVICTED"))
+    for scale in scales + scales:  # the second pass finds the scales that are still resident
+        frames_scaled = scaled_frames.frames_scaled
+        start = time.perf_counter()
+        scaled_frames.set_scale(scale, frame_sets)
+        switch_time = time.perf_counter() - start
+        frames_scaled = scaled_frames.frames_scaled - frames_scaled
+        print("{:>6} {:>9} {:>8.1f}ms {:>8} {:>7} {:>7.0f}KiB {:>8}".format(
+            scale, frames_scaled, switch_time * 1000, "scaled" if frames_scaled > 0 else "resident",
+            len(scaled_frames.variants), scaled_frames.resident_bytes / 1024, scaled_frames.evictions))
+    window.destroy()
+
+
+def benchmark_startup():  # time until START can be clicked, loading before or while displaying the title screen
+    for label, staged_loading in (("BEFORE TITLE", False), ("STAGED", True)):
+        for cache in ("COLD", "WARM"):
+            try:
+                window = Tk()
+            except TclError:
+                print("no display, the title screen cannot be displayed")
+                return
+            if cache == "COLD":
+                cache_directory = tempfile.TemporaryDirectory()
+            game = main.Main(window, staged_loading=staged_loading)
+            game.asset_cache = main.AssetCache(cache_directory=cache_directory.name)
+            game.game_process()
+            while game.time_to_interactive is None:
+                window.update()
+            print("{:>14} {:>6} {:>10.1f}ms".format(label, cache, game.time_to_interactive * 1000))
+            window.destroy()
+        cache_directory.cleanup()
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def start_round(game, difficulty):  # starts a new round if there is no round being played, returns the score of the last
+    if game.event_counter == 4 and game.player.health > 0:
+        return None
+    return game.start_round(difficulty)
+
+
+def state_checksum(game, checksum):  # folds the score and the position and health of every sprite into a crc
+    state = [game.game.score] + [(sprite.x, sprite.health) for sprite in game.game.sprite_list]
+    return zlib.crc32(repr(state).encode(), checksum)
+
+
+def run_game_loop(difficulty, enemy_count, ticks, seed, enemy_batch, trace_memory=False):
+    # plays rounds of a headless game with scripted input until the given number of ticks have been played
+    game = main.Main(enemy_batch=enemy_batch, seed=seed, enemy_count=enemy_count, quiet=True)
+    scripted_player = main.ScriptedPlayer(seed)
+    tick_times = []
+    rounds = 0
+    score = 0
+    checksum = 0  # changes if any tick plays differently, the score alone stays 0 until an enemy is defeated
+    game.game_state()  # loads assets
+    if trace_memory is True:
+        tracemalloc.start()
+    while len(tick_times) < ticks:
+        round_score = start_round(game, difficulty)  # setting up a round is not timed
+        if round_score is not None:
+            score += round_score
+            rounds += 1
+        scripted_player.press_keys(game.player, game.game.ticks)
+        start = time.perf_counter()
+        game.game_state()
+        tick_times.append(time.perf_counter() - start)
+        checksum = state_checksum(game, checksum)
+    peak_memory = 0
+    if trace_memory is True:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    score += game.game.score
+    return tick_times, peak_memory, rounds, score, checksum
+
+
+def benchmark_game_loop(difficulties, enemy_counts, modes, ticks, seed, trace_memory, repeats, warmup):
+    # every scenario is played once untimed to warm up, then the repeats go round all the scenarios in turn so each one
+    # is timed at several points of the run, the best repeat is kept as other work on the host only makes a run slower
+    scenarios = [(mode, enemy_count, difficulty) for mode in modes for enemy_count in enemy_counts
+                 for difficulty in difficulties]
+    for mode, enemy_count, difficulty in scenarios:
+        run_game_loop(difficulty, enemy_count, warmup, seed, mode == "batch")
+    runs = {scenario: [] for scenario in scenarios}
+    for i in range(repeats):
+        for mode, enemy_count, difficulty in scenarios:
+            runs[mode, enemy_count, difficulty].append(run_game_loop(difficulty, enemy_count, ticks, seed,
+                                                                     mode == "batch"))
+    results = []
+    print("{:<22} {:>10} {:>9} {:>9} {:>9} {:>11} {:>7} {:>7} {:>9}".format(
+        "SCENARIO", "TICKS/S", "P50 ms", "P95 ms", "P99 ms", "PEAK KiB", "ROUNDS", "SCORE", "CHECKSUM"))
+    for mode, enemy_count, difficulty in scenarios:
+        name = "d{}-e{}-{}".format(difficulty, enemy_count, mode)
+        scenario_runs = runs[mode, enemy_count, difficulty]
+        tick_times, peak_memory, rounds, score, checksum = scenario_runs[0]
+        if any(run[2:] != scenario_runs[0][2:] for run in scenario_runs):
+            print("{} played differently on a repeat".format(name))
+        if trace_memory is True:  # memory is measured in a separate run as tracing slows the game down
+            peak_memory = run_game_loop(difficulty, enemy_count, ticks, seed, mode == "batch", True)[1]
+        sorted_runs = [sorted(run[0]) for run in scenario_runs]
+        result = {"name": name, "difficulty": difficulty, "enemies": enemy_count, "mode": mode,
+                  "ticks": len(tick_times), "repeats": repeats,
+                  "ticks_per_second": max(len(run[0]) / sum(run[0]) for run in scenario_runs),
+                  "p50_ms": min(percentile(times, 0.5) for times in sorted_runs) * 1000,
+                  "p95_ms": min(percentile(times, 0.95) for times in sorted_runs) * 1000,
+                  "p99_ms": min(percentile(times, 0.99) for times in sorted_runs) * 1000,
+                  "peak_memory_kib": peak_memory / 1024, "rounds": rounds, "score": score, "checksum": checksum}
+        results.append(result)
+        print("{name:<22} {ticks_per_second:>10.0f} {p50_ms:>9.3f} {p95_ms:>9.3f} {p99_ms:>9.3f} "
+              "{peak_memory_kib:>11.0f} {rounds:>7} {score:>7} {checksum:>9x}".format(**result))
+    return {"benchmark": "loop", "seed": seed, "ticks": ticks, "python": platform.python_version(),
+            "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "scenarios": results}
+
+
+def run_ai_scenario(enemy_count, ticks, seed, ai_lod, ai_update_budget, check_near_enemies):
+    # plays a seeded game with the enemy AI profiled, optionally checking the AI of enemies near the player
+    game = main.Main(seed=seed, enemy_count=enemy_count, ai_lod=ai_lod, ai_update_budget=ai_update_budget,
+                     profile=True, quiet=True)
+    scripted_player = main.ScriptedPlayer(seed)
+    scratch_enemy = main.Enemy(game.canvas_width, game.canvas_height, 2)  # works out the AI as if run every tick
+    near_checked = 0
+    near_mismatches = 0
+    tick_times = []
+    game.game_state()  # loads assets
+    while len(tick_times) < ticks:
+        start_round(game, 4)
+        scripted_player.press_keys(game.player, game.game.ticks)
+        if check_near_enemies is True:
+            before = [(enemy, enemy.x, list(enemy.velocity), enemy.previous_direction)
+                      for enemy in game.game.sprite_list[1:] if enemy.visibility is True]
+        start = time.perf_counter()
+        game.game_state()
+        tick_times.append(time.perf_counter() - start)
+        if check_near_enemies is True and game.event_counter == 4:
+            player = game.player
+            near_distance = game.game.ai_scheduler.near_distance
+            player_x1, player_y1, player_x2, player_y2 = player.bbox
+            for enemy, x, velocity, previous_direction in before:
+                if x > player_x2 + near_distance or x + enemy.collision_width < player_x1 - near_distance:
+                    continue
+                scratch_enemy.x = x
+                scratch_enemy.velocity = velocity
+                scratch_enemy.previous_direction = previous_direction
+                scratch_enemy.change_movement(scratch_enemy.calculate_movement(player))
+                near_checked += 1
+                if scratch_enemy.velocity[-1] != enemy.velocity[-1]:
+                    near_mismatches += 1
+    return game, tick_times, near_checked, near_mismatches
+
+
+def benchmark_ai(enemy_counts, ticks, seed, ai_update_budget):  # compares AI on every tick with level of detail AI
+    print("{:>7} {:>10} {:>9} {:>12} {:>12} {:>12} {:>9} {:>9} {:>9} {:>14}".format(
+        "ENEMIES", "AI", "TICKS/S", "AI P50 ms", "AI P95 ms", "TICK P95 ms", "UPDATES", "SKIPPED", "DEFERRED",
+        "NEAR MISMATCH"))
+    for enemy_count in enemy_counts:
+        for ai_lod in (False, True):
+            game, tick_times, near_checked, near_mismatches = run_ai_scenario(
+                enemy_count, ticks, seed, ai_lod, ai_update_budget, ai_lod)
+            ai_p50, ai_p95, ai_p99 = game.game.profiler.percentiles("enemy_ai")
+            ai_scheduler = game.game.ai_scheduler
+            print("{:>7} {:>10} {:>9.0f} {:>12.3f} {:>12.3f} {:>12.3f} {:>9} {:>9} {:>9} {:>14}".format(
+                enemy_count, "lod" if ai_lod else "every tick", len(tick_times) / sum(tick_times), ai_p50 * 1000,
+                ai_p95 * 1000, percentile(sorted(tick_times), 0.95) * 1000,
+                ai_scheduler.updates if ai_lod else "-", ai_scheduler.skipped if ai_lod else "-",
+                ai_scheduler.deferred if ai_lod else "-",
+                "{}/{}".format(near_mismatches, near_checked) if ai_lod else "-"))
+
+
+def benchmark_batch(worker_counts, matches, seed, max_ticks):  # how batch.py scales as worker processes are added
+    print("{} CPUS".format(os.cpu_count()))
+    print("{:>8} {:>9} {:>11} {:>10} {:>9} {:>11}".format(
+        "WORKERS", "SECONDS", "MATCHES/S", "TICKS/S", "SPEED UP", "EFFICIENCY"))
+    first_rate = None
+    with tempfile.TemporaryDirectory() as output_directory, open(os.devnull, "w") as devnull:
+        for workers in worker_counts:
+            with contextlib.redirect_stderr(devnull):  # hides the progress count
+                summary = batch.run_batch([1, 2, 3, 4], ["scripted"], matches, seed, max_ticks, None, False, workers,
+                                          1, os.path.join(output_directory, "results.jsonl"))
+            if first_rate is None:
+                first_rate = summary["matches_per_second"] / workers
+            speed_up = summary["matches_per_second"] / first_rate
+            print("{:>8} {:>9.1f} {:>11.1f} {:>10.0f} {:>8.2f}x {:>10.0%}".format(
+                workers, summary["seconds"], summary["matches_per_second"], summary["ticks_per_second"], speed_up,
+                speed_up / workers))
+
+
+def benchmark_env(counts, worker_counts, steps, seed, difficulty):  # steps per second of the training environment
+    # a game in a window runs at most one tick every tick_length seconds however many windows are open
+    real_time_rate = 1 / main.Main(ai_lod=False).tick_length
+    print("{:>6} {:>8} {:>12} {:>14} {:>10} {:>9}".format(
+        "GAMES", "WORKERS", "STEPS/S", "REAL TIME/S", "SPEED UP", "EPISODES"))
+    for count in counts:
+        for workers in sorted(set(min(workers, count) for workers in worker_counts)):  # a worker plays a game at least
+            vector_env = env.VectorFighterEnv(count, difficulty=difficulty, workers=workers)
+            vector_env.reset(seed)
+            actions = random.Random(seed)
+            episodes = 0
+            start_time = time.perf_counter()
+            for step in range(steps):
+                observations, rewards, dones, infos = vector_env.step(
+                    [actions.randrange(vector_env.action_count) for i in range(count)])
+                episodes += int(dones.sum())
+            steps_per_second = count * steps / (time.perf_counter() - start_time)
+            vector_env.close()
+            print("{:>6} {:>8} {:>12.0f} {:>14.0f} {:>9.1f}x {:>9}".format(
+                count, vector_env.workers, steps_per_second, count * real_time_rate,
+                steps_per_second / (count * real_time_rate), episodes))
+
+
+def benchmark_horde(modes, ticks, seed, min_enemies, target_rate):
+    # plays horde mode until at least min_enemies are on screen then times ticks against a target tick rate
+    print("{:>7} {:>9} {:>11} {:>10} {:>10} {:>10} {:>9}  {}".format(
+        "MODE", "TICKS/S", "ENEMIES", "P50 ms", "P95 ms", "P99 ms", "WAVE", "RESULT"))
+    missed = False
+    for mode in modes:
+        game = main.Main(enemy_batch=mode == "batch", seed=seed, horde=True, quiet=True)
+        scripted_player = main.ScriptedPlayer(seed)
+        tick_times = []
+        on_screen = []
+        game.start_round(4)  # difficulty 4 starts on the fourth wave
+        while len(tick_times) < ticks and game.game.ticks < ticks * 10:  # stops if the horde never gets that big
+            game.player.health = (0, game.player.default_health)  # the player survives so the horde keeps growing
+            scripted_player.press_keys(game.player, game.game.ticks)
+            start = time.perf_counter()
+            game.game_state()
+            tick_time = time.perf_counter() - start
+            enemies = len(game.game.sprite_list) - 1
+            if enemies >= min_enemies:  # ticks while the horde is still spawning are not timed
+                tick_times.append(tick_time)
+                on_screen.append(enemies)
+        if not tick_times:
+            print("{:>7} NEVER REACHED {} ENEMIES".format(mode, min_enemies))
+            missed = True
+            continue
+        tick_times.sort()
+        p95 = percentile(tick_times, 0.95)
+        result = "ok" if p95 <= 1 / target_rate else "MISSED {}/s".format(target_rate)
+        missed = missed or p95 > 1 / target_rate
+        print("{:>7} {:>9.0f} {:>11} {:>10.3f} {:>10.3f} {:>10.3f} {:>9}  {}".format(
+            mode, len(tick_times) / sum(tick_times), sum(on_screen) // len(on_screen), percentile(tick_times, 0.5) * 1000, p95 * 1000,
+            percentile(tick_times, 0.99) * 1000, game.game.horde.wave_number, result))
+    return missed
+
+
+def benchmark_snapshot(enemy_counts, ticks, repeats, seed):  # size and time of snapshots as the enemy count grows
+    # the random state takes up about 2.5KiB of every snapshot, each enemy adds a few dozen bytes on top
+    diverged = False
+    print("{:>7} {:>9} {:>12} {:>11} {:>11} {:>11} {:>11}  {}".format(
+        "ENEMIES", "BYTES", "BYTES/ENEMY", "SAVE P50 us", "SAVE P95 us", "LOAD P50 us", "LOAD P95 us", "RESUMES"))
+    for enemy_count in enemy_counts:
+        game = main.Main(seed=seed, enemy_count=enemy_count, quiet=True)
+        scripted_player = main.ScriptedPlayer(seed)
+        game.start_round(4)
+        for tick in range(ticks):  # plays for a while so the enemies are spread out and part way through actions
+            game.player.health = (0, game.player.default_health)
+            scripted_player.press_keys(game.player, game.game.ticks)
+            game.game_state()
+        enemy_bytes = sum(len(enemy.save_state()) for enemy in game.game.sprite_list[1:])
+        save_times = []
+        for i in range(repeats):
+            start = time.perf_counter()
+            snapshot = game.save_snapshot()
+            save_times.append(time.perf_counter() - start)
+        load_times = []
+        for i in range(repeats):
+            start = time.perf_counter()
+            game.load_snapshot(snapshot)
+            load_times.append(time.perf_counter() - start)
+        # the restored game must play on exactly as the saved one did
+        resumed_player = copy.deepcopy(scripted_player)
+        for tick in range(ticks):
+            game.player.health = (0, game.player.default_health)
+            scripted_player.press_keys(game.player, game.game.ticks)
+            game.game_state()
+        played_on = game.save_snapshot()
+        game.load_snapshot(snapshot)
+        for tick in range(ticks):
+            game.player.health = (0, game.player.default_health)
+            resumed_player.press_keys(game.player, game.game.ticks)
+            game.game_state()
+        resumes = game.save_snapshot() == played_on
+        save_times.sort()
+        load_times.sort()
+        diverged = diverged or not resumes
+        print("{:>7} {:>9} {:>12.1f} {:>11.0f} {:>11.0f} {:>11.0f} {:>11.0f}  {}".format(
+            enemy_count, len(snapshot), enemy_bytes / enemy_count, percentile(save_times, 0.5) * 1e6,
+            percentile(save_times, 0.95) * 1e6, percentile(load_times, 0.5) * 1e6, percentile(load_times, 0.95) * 1e6,
+            "identically" if resumes else "DIFFERENTLY"))
+    return diverged
+
+
+def compare_results(results, baseline, tolerance):  # prints the change from a baseline, returns True if slower
+    baseline_scenarios = {scenario["name"]: scenario for scenario in baseline["scenarios"]}
+    regressed = False
+    print("{:<22} {:>12} {:>12}  {}".format("SCENARIO", "TICKS/S", "P95", "RESULT"))
+    for scenario in results["scenarios"]:
+        previous = baseline_scenarios.get(scenario["name"])
+        if previous is None:
+            continue
+        rate_change = scenario["ticks_per_second"] / previous["ticks_per_second"] - 1
+        p95_change = scenario["p95_ms"] / previous["p95_ms"] - 1 if previous["p95_ms"] > 0 else 0.0
+        notes = []
+        # a slower game drops the tick rate and raises the p95 together, the noise of a busy host mostly moves just one
+        if rate_change < -tolerance and p95_change > tolerance:
+            notes.append("REGRESSION")
+            regressed = True
+        # the same seed and input should always give the same game, baselines from before the checksum only have the
+        # rounds and score to go on
+        gameplay = ("rounds", "score", "checksum") if "checksum" in previous else ("rounds", "score")
+        if any(scenario[key] != previous[key] for key in gameplay) and \
+                (results["seed"], results["ticks"]) == (baseline["seed"], baseline["ticks"]):
+            notes.append("GAMEPLAY CHANGED")
+        print("{:<22} {:>+11.1%} {:>+11.1%}  {}".format(scenario["name"], rate_change, p95_change,
+                                                       ", ".join(notes) or "ok"))
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="performance benchmarks for BEAT 'EM UP")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    collision_parser = subparsers.add_parser("collision", help="collision grid against a linear scan and the canvas")
+    collision_parser.add_argument("--enemies", type=int, nargs="+", default=[4, 16, 64, 256, 1024])
+    collision_parser.add_argument("--ticks", type=int, default=200)
+    collision_parser.add_argument("--seed", type=int, default=0)
+    assets_parser = subparsers.add_parser("assets", help="asset loading with and without the asset cache")
+    assets_parser.add_argument("--assets", nargs="+", default=["giphy-6", "player", "player-left-move", "enemy",
+                                                               "enemy-left-move"])
+    scale_parser = subparsers.add_parser("scale", help="switching render scale with the scaled frame cache")
+    scale_parser.add_argument("--assets", nargs="+", default=["giphy-6", "player", "player-left-move", "enemy",
+                                                              "enemy-left-move"])
+    scale_parser.add_argument("--scales", type=float, nargs="+", default=[1.5, 2, 0.5])
+    scale_parser.add_argument("--max-scales", type=int, default=2, help="scaled variants kept resident")
+    subparsers.add_parser("startup", help="time to interactive with and without staged asset loading")
+    ai_parser = subparsers.add_parser("ai", help="enemy AI on every tick against level of detail AI")
+    ai_parser.add_argument("--enemies", type=int, nargs="+", default=[16, 64, 256, 1024])
+    ai_parser.add_argument("--ticks", type=int, default=300)
+    ai_parser.add_argument("--seed", type=int, default=0)
+    ai_parser.add_argument("--budget", type=int, default=main.AI_UPDATE_BUDGET,
+                           help="AI updates per tick before far enemies are deferred")
+    env_parser = subparsers.add_parser("env", help="steps per second of the training environment")
+    env_parser.add_argument("--games", type=int, nargs="+", default=[1, 16, 64])
+    env_parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1],
+                            help="processes the games are spread across")
+    env_parser.add_argument("--steps", type=int, default=1000)
+    env_parser.add_argument("--seed", type=int, default=0)
+    env_parser.add_argument("--difficulty", type=int, default=4)
+    batch_parser = subparsers.add_parser("batch", help="matches per second of batch.py for each number of workers")
+    batch_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    batch_parser.add_argument("--matches", type=int, default=25, help="matches at each difficulty")
+    batch_parser.add_argument("--max-ticks", type=int, default=5000)
+    batch_parser.add_argument("--seed", type=int, default=0)
+    horde_parser = subparsers.add_parser("horde", help="tick rate of horde mode with hundreds of enemies on screen")
+    horde_parser.add_argument("--modes", nargs="+", choices=["object", "batch"],
+                              default=["object", "batch"] if numpy is not None else ["object"])
+    horde_parser.add_argument("--ticks", type=int, default=1000, help="ticks timed once the horde is on screen")
+    horde_parser.add_argument("--seed", type=int, default=0)
+    horde_parser.add_argument("--enemies", type=int, default=300, help="enemies on screen before ticks are timed")
+    horde_parser.add_argument("--target", type=int, default=60, help="ticks per second the p95 tick time must meet")
+    snapshot_parser = subparsers.add_parser("snapshot", help="size and time of snapshots as the enemy count grows")
+    snapshot_parser.add_argument("--enemies", type=int, nargs="+", default=[1, 16, 64, 256, 1024])
+    snapshot_parser.add_argument("--ticks", type=int, default=300, help="ticks played before and after the snapshot")
+    snapshot_parser.add_argument("--repeats", type=int, default=200, help="snapshots saved and loaded to time")
+    snapshot_parser.add_argument("--seed", type=int, default=0)
+    loop_parser = subparsers.add_parser("loop", help="seeded headless game loop at each difficulty and enemy count")
+    loop_parser.add_argument("--difficulties", type=int, nargs="+", default=[1, 2, 3, 4])
+    loop_parser.add_argument("--enemies", type=int, nargs="+", default=[4, 32, 128, 512])
+    loop_parser.add_argument("--modes", nargs="+", choices=["object", "batch"],
+                             default=["object", "batch"] if numpy is not None else ["object"],
+                             help="update enemies one at a time or with the numpy enemy batch")
+    loop_parser.add_argument("--ticks", type=int, default=2000)
+    loop_parser.add_argument("--seed", type=int, default=0)
+    loop_parser.add_argument("--repeats", type=int, default=5, help="timed runs of each scenario, the best is kept")
+    loop_parser.add_argument("--warmup", type=int, default=100, help="untimed ticks played before each scenario")
+    loop_parser.add_argument("--no-memory", action="store_true", help="skip the slower peak memory measurement")
+    loop_parser.add_argument("--output", default="benchmark_results.json", help="json file the results are saved to")
+    loop_parser.add_argument("--compare", metavar="BASELINE", help="results file to check for regressions against")
+    loop_parser.add_argument("--tolerance", type=float, default=0.25,
+                             help="fraction ticks/s and p95 both have to get worse by for a regression")
+    arguments = parser.parse_args()
+    if arguments.benchmark == "collision":
+        benchmark_collision(arguments.enemies, arguments.ticks, arguments.seed)
+    elif arguments.benchmark == "assets":
+        benchmark_assets(arguments.assets)
+    elif arguments.benchmark == "scale":
+        benchmark_scale(arguments.assets, arguments.scales, arguments.max_scales)
+    elif arguments.benchmark == "startup":
+        benchmark_startup()
+    elif arguments.benchmark == "ai":
+        benchmark_ai(arguments.enemies, arguments.ticks, arguments.seed, arguments.budget)
+    elif arguments.benchmark == "env":
+        benchmark_env(arguments.games, arguments.workers, arguments.steps, arguments.seed,
+                      arguments.difficulty)
+    elif arguments.benchmark == "batch":
+        benchmark_batch(arguments.workers, arguments.matches, arguments.seed, arguments.max_ticks)
+    elif arguments.benchmark == "horde":
+        if benchmark_horde(arguments.modes, arguments.ticks, arguments.seed, arguments.enemies, arguments.target):
+            sys.exit(1)
+    elif arguments.benchmark == "snapshot":
+        if benchmark_snapshot(arguments.enemies, arguments.ticks, arguments.repeats, arguments.seed):
+            sys.exit(1)
+    elif arguments.benchmark == "loop":
+        loop_results = benchmark_game_loop(arguments.difficulties, arguments.enemies, arguments.modes,
+                                           arguments.ticks, arguments.seed, not arguments.no_memory,
+                                           arguments.repeats, arguments.warmup)
+        with open(arguments.output, "w") as output_file:
+            json.dump(loop_results, output_file, indent=1)
+        print("RESULTS SAVED TO {}".format(arguments.output))
+        if arguments.compare is not None:
+            with open(arguments.compare) as baseline_file:
+                if compare_results(loop_results, json.load(baseline_file), arguments.tolerance):
+                    sys.exit(1)
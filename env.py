@@ -0,0 +1,209 @@
+import multiprocessing
+
+try:
+    import numpy
+except ImportError:  # the environments need numpy for their observations
+    numpy = None
+
+import main
+
+__author__ = "Jack Ashton"
+
+ACTIONS = main.PlayerController.actions  # an action is an index into this tuple
+PLAYER_FEATURES = 6  # x, health, attacking, ducking, facing, x velocity
+ENEMY_FEATURES = 7  # present, x from the player, health, attacking, ducking, facing, sprite type
+
+
+class FighterEnv:  # reset()/step() interface to one headless game for training automated players
+    def __init__(self, difficulty=4, enemy_count=None, max_enemies=8, max_ticks=30000, enemy_batch=False):
+        if numpy is None:
+            raise ImportError("numpy is required for the environment")
+        self.difficulty = difficulty
+        self.enemy_count = enemy_count  # enemies in the game, the difficulty is used when this is None
+        self.max_enemies = max_enemies  # enemies in an observation, the nearest are observed when there are more
+        self.max_ticks = max_ticks  # an episode stops here if the player is still alive
+        self.enemy_batch = enemy_batch
+        self.observation_size = PLAYER_FEATURES + max_enemies * ENEMY_FEATURES
+        self.action_count = len(ACTIONS)
+        self.next_seed = None
+        self.seed_step = 1  # seeds of later episodes follow on from the seed given to reset
+        self.game = None
+        self.controller = None
+        self.score = 0
+        self.health = 0
+
+    def reset(self, seed=None, observation=None):  # starts a new episode, returns the first observation
+        if seed is None:
+            seed = self.next_seed
+        if seed is not None:
+            self.next_seed = seed + self.seed_step
+        self.game = main.Main(seed=seed, enemy_count=self.enemy_count, enemy_batch=self.enemy_batch, quiet=True)
+        self.game.start_round(self.difficulty)
+        self.controller = main.PlayerController()
+        self.score = 0
+        self.health = self.game.player.health
+        return self.observe(observation)
+
+    def step(self, action, observation=None):  # plays one tick, returns observation, reward, done and info
+        game = self.game
+        player = game.player
+        if player.visibility is True:  # keys do nothing until the player spawns
+            self.controller.perform(player, ACTIONS[action])
+        game.game_state()
+        score = game.game.score
+        health = player.health
+        reward = (score - self.score) - (self.health - health)  # points for defeated enemies less damage taken
+        self.score = score
+        self.health = health
+        died = health <= 0
+        done = died or game.ticks_played >= self.max_ticks
+        info = {"score": score, "health": health, "ticks": game.ticks_played, "died": died}
+        return self.observe(observation), reward, done, info
+
+    def observe(self, observation=None):  # flat array of the player followed by the nearest enemies
+        if observation is None:
+            observation = numpy.zeros(self.observation_size, dtype=numpy.float32)
+        else:
+            observation[:] = 0
+        player = self.game.player
+        observation[:PLAYER_FEATURES] = (player.x, player.health, player.attack is True, player.duck is True,
+                                         1 if player.previous_direction == "right" else -1, player.velocity[-1])
+        enemies = [enemy for enemy in self.game.game.sprite_list[1:] if enemy.visibility is True]
+        enemies.sort(key=lambda enemy: abs(enemy.x - player.x))
+        for i, enemy in enumerate(enemies[:self.max_enemies]):
+            start = PLAYER_FEATURES + i * ENEMY_FEATURES
+            observation[start:start + ENEMY_FEATURES] = (
+                1, enemy.x - player.x, enemy.health, enemy.attack is True, enemy.duck is True,
+                1 if enemy.previous_direction == "right" else -1, enemy.sprite_type)
+        return observation
+
+    def close(self):
+        self.game = None
+
+
+class GameGroup:  # some of the games of a VectorFighterEnv, stepped in this process or in a worker process
+    def __init__(self, first, count, total, env_arguments, observations, rewards, dones):
+        self.first = first  # index of the group's first game in the VectorFighterEnv
+        self.envs = [FighterEnv(*env_arguments) for i in range(count)]
+        for env in self.envs:
+            env.seed_step = total  # every game plays different seeds
+        self.observations = observations[first:first + count]  # views into the arrays of the VectorFighterEnv
+        self.rewards = rewards[first:first + count]
+        self.dones = dones[first:first + count]
+
+    def reset(self, seed):  # game i of the VectorFighterEnv plays seed + i
+        for i, env in enumerate(self.envs):
+            env.reset(seed + self.first + i if seed is not None else None, self.observations[i])
+
+    def step(self, actions):  # plays one tick of every game in the group, returns their infos
+        infos = []
+        for i, env in enumerate(self.envs):
+            observation, reward, done, info = env.step(actions[i], self.observations[i])
+            if done is True:
+                info["final_observation"] = observation.copy()
+                env.reset(observation=self.observations[i])
+            self.rewards[i] = reward
+            self.dones[i] = done
+            infos.append(info)
+        return infos
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+def shared_array(raw_array, dtype, shape):  # numpy view of memory shared with the worker processes
+    return numpy.frombuffer(raw_array, dtype=dtype).reshape(shape)
+
+
+def run_worker(connection, first, count, total, env_arguments, shared_arrays):
+    # plays a group of games in a worker process, the observations, rewards and done flags are written straight into
+    # memory shared with the VectorFighterEnv so only the actions and infos go through the pipe
+    raw_observations, raw_rewards, raw_dones = shared_arrays
+    observation_size = PLAYER_FEATURES + env_arguments[2] * ENEMY_FEATURES  # the third argument is max_enemies
+    group = GameGroup(first, count, total, env_arguments,
+                      shared_array(raw_observations, numpy.float32, (total, observation_size)),
+                      shared_array(raw_rewards, numpy.float32, total), shared_array(raw_dones, bool, total))
+    while True:
+        command, value = connection.recv()
+        if command == "reset":
+            group.reset(value)
+            connection.send(None)
+        elif command == "step":
+            connection.send(group.step(value))
+        else:
+            group.close()
+            connection.close()
+            return
+
+
+class VectorFighterEnv:  # steps many independent games in lock-step with shared observations and rewards
+    # each game still runs its own Python loop, so with one worker the steps per second stay the same however many
+    # games there are, more workers spread the games across processes and only go faster with a core for each
+    def __init__(self, count, difficulty=4, enemy_count=None, max_enemies=8, max_ticks=30000, enemy_batch=False,
+                 workers=1):
+        if numpy is None:
+            raise ImportError("numpy is required for the environment")
+        env_arguments = (difficulty, enemy_count, max_enemies, max_ticks, enemy_batch)
+        self.count = count
+        self.observation_size = PLAYER_FEATURES + max_enemies * ENEMY_FEATURES
+        self.action_count = len(ACTIONS)
+        self.workers = max(1, min(workers, count))
+        self.groups = []  # first game and number of games played by each worker
+        for worker in range(self.workers):
+            first = count * worker // self.workers
+            self.groups.append((first, count * (worker + 1) // self.workers - first))
+        self.connections = []
+        self.processes = []
+        if self.workers == 1:  # plays every game in this process
+            self.observations = numpy.zeros((count, self.observation_size), dtype=numpy.float32)
+            self.rewards = numpy.zeros(count, dtype=numpy.float32)
+            self.dones = numpy.zeros(count, dtype=bool)
+            self.group = GameGroup(0, count, count, env_arguments, self.observations, self.rewards, self.dones)
+            return
+        self.group = None
+        shared_arrays = (multiprocessing.RawArray("f", count * self.observation_size),
+                         multiprocessing.RawArray("f", count), multiprocessing.RawArray("b", count))
+        self.observations = shared_array(shared_arrays[0], numpy.float32, (count, self.observation_size))
+        self.rewards = shared_array(shared_arrays[1], numpy.float32, count)
+        self.dones = shared_array(shared_arrays[2], bool, count)
+        for first, group_count in self.groups:
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=run_worker, daemon=True, args=(
+                worker_connection, first, group_count, count, env_arguments, shared_arrays))
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def reset(self, seed=None):  # game i plays seed + i, returns an observation for every game
+        if self.group is not None:
+            self.group.reset(seed)
+            return self.observations
+        for connection in self.connections:  # every worker resets its games at the same time
+            connection.send(("reset", seed))
+        for connection in self.connections:
+            connection.recv()
+        return self.observations
+
+    def step(self, actions):  # plays one tick of every game, finished games start a new episode straight away
+        actions = [int(action) for action in actions]
+        if self.group is not None:
+            return self.observations, self.rewards, self.dones, self.group.step(actions)
+        for connection, (first, group_count) in zip(self.connections, self.groups):
+            connection.send(("step", actions[first:first + group_count]))
+        infos = []
+        for connection in self.connections:  # waits for every worker so the games stay in lock-step
+            infos.extend(connection.recv())
+        return self.observations, self.rewards, self.dones, infos
+
+    def close(self):
+        if self.group is not None:
+            self.group.close()
+        for connection in self.connections:
+            connection.send(("close", None))
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
@@ -1,16 +1,206 @@
 from tkinter import *
+import argparse
+import base64
+import collections
+import csv
+import fractions
+import hashlib
+import json
+import os
+import queue
 import random
+import struct
+import sys
+import threading
+import time
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, without it enemies are updated one at a time
+    numpy = None
 
 __author__ = "Jack Ashton"
 __version__ = "3.0"
 
+IMAGE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+ASSET_CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "asset_cache")
+
+
+def gif_frame_count(data):  # counts the frames of a gif by walking its blocks, no image data is decoded
+    position = 13  # skips the header and logical screen descriptor
+    if data[10] & 0x80:  # skips the global colour table
+        position += 3 * (2 << (data[10] & 0x07))
+    frame_count = 0
+    while position < len(data) and data[position] != 0x3B:  # 0x3B is the gif trailer
+        if data[position] == 0x2C:  # image descriptor, each one is a frame
+            frame_count += 1
+            flags = data[position + 9]
+            position += 10
+            if flags & 0x80:  # skips the local colour table
+                position += 3 * (2 << (flags & 0x07))
+            position += 1  # skips the lzw minimum code size
+        else:  # extension block
+            position += 2
+        while data[position] != 0:  # skips the data sub-blocks
+            position += data[position] + 1
+        position += 1
+    return frame_count
+
+
+class AssetCache:  # keeps decoded gif animations as a png frame atlas so later starts do not decode the gifs again
+    version = 1  # changing this rebuilds every cached atlas
+
+    def __init__(self, image_directory=IMAGE_DIRECTORY, cache_directory=ASSET_CACHE_DIRECTORY):
+        self.image_directory = image_directory
+        self.cache_directory = cache_directory
+        self.hits = 0  # animations loaded from an atlas
+        self.misses = 0  # animations decoded from their gif
+
+    def _paths(self, name):  # paths of the gif, its metadata and its atlas
+        return (os.path.join(self.image_directory, "{}.gif".format(name)),
+                os.path.join(self.cache_directory, "{}.json".format(name)),
+                os.path.join(self.cache_directory, "{}.png".format(name)))
+
+    def read_metadata(self, name):  # returns the metadata of the cached atlas, None when there is no atlas or it is stale
+        gif_path, metadata_path, atlas_path = self._paths(name)
+        try:
+            with open(metadata_path) as metadata_file:
+                metadata = json.load(metadata_file)
+            source = os.stat(gif_path)
+        except (OSError, ValueError):
+            return None
+        if metadata.get("version") != self.version or not os.path.exists(atlas_path):
+            return None
+        if metadata["source_mtime"] == source.st_mtime_ns and metadata["source_size"] == source.st_size:
+            return metadata
+        with open(gif_path, "rb") as gif_file:  # the gif was touched, it only needs decoding if its contents changed
+            source_hash = hashlib.sha1(gif_file.read()).hexdigest()
+        if source_hash != metadata["source_hash"]:
+            return None
+        metadata["source_mtime"] = source.st_mtime_ns
+        self._write_metadata(metadata_path, metadata)
+        return metadata
+
+    def _write_metadata(self, metadata_path, metadata):
+        try:
+            with open(metadata_path + ".tmp", "w") as metadata_file:
+                json.dump(metadata, metadata_file)
+            os.replace(metadata_path + ".tmp", metadata_path)  # readers never see a partly written file
+        except OSError:  # the cache is only an optimisation, a read only disk decodes the gifs every start
+            pass
+
+    def prepare(self, name):  # reads everything an animation needs from disk, this makes no tkinter calls
+        # so it can run on another thread, tkinter images can only be created on the thread running the window
+        metadata = self.read_metadata(name)
+        if metadata is not None:
+            self.hits += 1
+            return name, metadata, None
+        self.misses += 1
+        with open(self._paths(name)[0], "rb") as gif_file:
+            data = gif_file.read()
+        return name, None, data
+
+    def decode(self, prepared):  # generator that creates the frames of a prepared animation one at a time
+        # it yields after each step so decoding can be spread across game ticks, the frames are its return value
+        name, metadata, data = prepared
+        gif_path, metadata_path, atlas_path = self._paths(name)
+        frames = []
+        if metadata is not None:
+            atlas = PhotoImage(file=atlas_path)  # the whole animation is decoded at once
+            yield
+            for x, width, height in metadata["frames"]:
+                frame = PhotoImage(width=width, height=height)
+                frame.tk.call(frame.name, "copy", atlas.name, "-from", x, 0, x + width, height)
+                frames.append(frame)
+                yield
+            return frames
+
+        source = os.stat(gif_path)
+        encoded_data = base64.b64encode(data)
+        for i in range(gif_frame_count(data)):  # the number of frames is known so no decode fails past the last frame
+            frames.append(PhotoImage(data=encoded_data, format="gif -index {}".format(i)))
+            yield
+        if not frames:
+            return frames
+
+        atlas = PhotoImage(width=sum(frame.width() for frame in frames), height=max(frame.height() for frame in frames))
+        frame_metadata = []
+        x = 0
+        for frame in frames:  # frames are placed side by side
+            atlas.tk.call(atlas.name, "copy", frame.name, "-to", x, 0)
+            frame_metadata.append([x, frame.width(), frame.height()])
+            x += frame.width()
+        try:
+            os.makedirs(self.cache_directory, exist_ok=True)
+            atlas.write(atlas_path + ".tmp", format="png")
+            os.replace(atlas_path + ".tmp", atlas_path)
+        except (OSError, TclError):
+            return frames
+        self._write_metadata(metadata_path, {"version": self.version, "source_hash": hashlib.sha1(data).hexdigest(),
+                                             "source_mtime": source.st_mtime_ns, "source_size": source.st_size,
+                                             "frames": frame_metadata})
+        return frames
+
+    def load(self, name):  # returns the frames of an animation as images, from the atlas when it is up to date
+        decoder = self.decode(self.prepare(name))
+        while True:
+            try:
+                next(decoder)
+            except StopIteration as finished:
+                return finished.value
+
+
+class AssetLoader:  # loads animations in small steps between game ticks so the window stays responsive while loading
+    def __init__(self, asset_cache, asset_list):
+        self.asset_cache = asset_cache
+        self.asset_list = asset_list
+        self.prepared = queue.Queue()  # animations read from disk by the thread, waiting to be decoded
+        self.thread = threading.Thread(target=self._prepare_assets, daemon=True)
+        self.loaded = {}  # maps the name of each loaded animation to its frames
+        self._decoding = None  # name and decoder of the animation currently being decoded
+        self.error = None  # set if the thread fails to read an asset
+
+    def start(self):
+        self.thread.start()
+
+    def _prepare_assets(self):  # runs on the thread
+        try:
+            for name in self.asset_list:
+                self.prepared.put(self.asset_cache.prepare(name))
+        except OSError as error:
+            self.error = error
+
+    @property
+    def done(self):
+        return len(self.loaded) == len(self.asset_list)
+
+    def step(self, time_budget):  # decodes frames on the window thread until the time budget in seconds is used up
+        if self.error is not None:
+            raise self.error
+        deadline = time.perf_counter() + time_budget
+        while not self.done and time.perf_counter() < deadline:
+            if self._decoding is None:
+                try:
+                    prepared = self.prepared.get_nowait()
+                except queue.Empty:  # the thread is still reading from disk
+                    return
+                self._decoding = (prepared[0], self.asset_cache.decode(prepared))
+            name, decoder = self._decoding
+            try:
+                next(decoder)
+            except StopIteration as finished:
+                self.loaded[name] = finished.value
+                self._decoding = None
+
 
 class TitleScreen:  # contains attributes and methods for the title screen of the game
-    def __init__(self, canvas, canvas_height, canvas_width):
+    def __init__(self, canvas, canvas_height, canvas_width, scaled_frames=None):
         self.canvas = canvas
         self.canvas_height = canvas_height
         self.canvas_width = canvas_width
-        self.title_image = PhotoImage(file="images/title.gif")  # stores the title image for the game
+        self.scaled_frames = scaled_frames  # the title is drawn at the scale of these frames, at a scale of 1 without
+        self.title_image = PhotoImage(file=os.path.join(IMAGE_DIRECTORY, "title.gif"))  # stores the title image for the game
+        self.displayed_title_image = self.title_image  # kept so the scaled image is not freed while it is shown
         self.title = Label(self.canvas, image=self.title_image, borderwidth=0, anchor=NW)  # displays the title image
         self.button_frame = Frame(self.canvas, padx=2.5, pady=2.5)
         self.difficulty_scale = Scale(self.button_frame, from_=1, to_=4, orient=HORIZONTAL)  # used to choose difficulty
@@ -25,13 +215,31 @@ class TitleScreen:  # contains attributes and methods for the title screen of th
         self.start = False  # this is checked by 'game_process' in Main() to start the game when value is 'True'
         self.start_button = Button(self.button_frame, text="START", bg="black", fg="white", font=("", 10),
                                    command=self.start_game, takefocus=0)
+        self.loading_label = Label(self.button_frame, text="", bg="black", fg="white")  # shows asset loading progress
+        self.assets_loaded = True  # START is disabled while this is False
 
     def display_title_screen(self):  # displays the widgets for the title screen
+        scale = 1
+        if self.scaled_frames is not None:
+            scale = float(self.scaled_frames.scale)
+            self.displayed_title_image = self.scaled_frames.get(self.title_image)
+            self.title.config(image=self.displayed_title_image)
         self.title.place(x=0, y=0)
-        self.button_frame.place(x=(self.canvas_width / 2), y=100, anchor=CENTER)
+        self.button_frame.place(x=(self.canvas_width / 2), y=100 * scale, anchor=CENTER)
         self.difficulty_scale.grid(row=1, column=1, columnspan=2)
         self.instruction_button.grid(row=2, column=1)
         self.start_button.grid(row=2, column=2)
+        if self.assets_loaded is False:
+            self.loading_label.grid(row=3, column=1, columnspan=2)
+
+    def display_loading_progress(self, loaded, total):  # updates the loading progress, START is enabled when complete
+        self.assets_loaded = loaded == total
+        if self.assets_loaded is True:
+            self.loading_label.grid_forget()
+            self.start_button.config(state=NORMAL)
+        else:
+            self.loading_label.config(text="LOADING {}%".format(int(loaded / total * 100)))
+            self.start_button.config(state=DISABLED)
 
     def display_instructions(self):  # displays the instructions and sets the instruction text
         self.instruction_button.config(text="CLOSE INSTRUCTIONS", command=self.remove_instructions)
@@ -65,20 +273,439 @@ class TitleScreen:  # contains attributes and methods for the title screen of th
         self.button_frame.place_forget()   # removes button frame
 
     def start_game(self):
+        if self.assets_loaded is False:  # the game cannot start without its images
+            return
         self.start = True  # checked by 'game_process' method in Main() to start game when value is 'True'
 
 
-class Game:  # contains methods and attributes for playing the game
-    def __init__(self, canvas, canvas_height, canvas_width, background_animation_speed):
-        self.canvas = canvas
+class TickProfiler:  # times each phase of a game tick and keeps rolling percentiles of the phase times
+    phases = ("background", "enemy_ai", "movement", "collision", "interaction", "score_removal", "health_bar",
+              "timers")
+
+    def __init__(self, window_size=1000, history_size=100000):
+        self.window_size = window_size  # number of recent ticks percentiles are calculated from
+        self.samples = {phase: collections.deque(maxlen=window_size) for phase in self.phases + ("tick", "render")}
+        self.history = collections.deque(maxlen=history_size)  # phase times of every tick for the dump on exit
+        self.current = dict.fromkeys(self.phases, 0.0)  # phase times of the tick being run
+        self.ticks = 0
+        self._tick_start = 0.0
+        self._lap_time = 0.0
+
+    def begin_tick(self):
+        for phase in self.phases:
+            self.current[phase] = 0.0
+        self._tick_start = self._lap_time = time.perf_counter()
+
+    def lap(self, phase):  # adds the time since the previous lap to a phase, one clock read per phase
+        now = time.perf_counter()
+        self.current[phase] += now - self._lap_time
+        self._lap_time = now
+
+    def move(self, from_phase, to_phase, seconds):  # moves time already lapped in one phase of this tick to another
+        self.current[from_phase] -= seconds
+        self.current[to_phase] += seconds
+
+    def end_tick(self):
+        tick_time = time.perf_counter() - self._tick_start
+        for phase in self.phases:
+            self.samples[phase].append(self.current[phase])
+        self.samples["tick"].append(tick_time)
+        self.history.append([self.ticks, tick_time] + [self.current[phase] for phase in self.phases])
+        self.ticks += 1
+
+    def record_render(self, render_time):  # frames are drawn separately from ticks so they are timed on their own
+        self.samples["render"].append(render_time)
+
+    def percentiles(self, phase):  # p50, p95 and p99 in seconds of the recent times of a phase
+        samples = sorted(self.samples[phase])
+        if not samples:
+            return 0.0, 0.0, 0.0
+        return tuple(samples[min(int(len(samples) * fraction), len(samples) - 1)] for fraction in (0.5, 0.95, 0.99))
+
+    def summary(self):  # percentiles of every phase in milliseconds
+        return {phase: dict(zip(("p50", "p95", "p99"), [value * 1000 for value in self.percentiles(phase)]))
+                for phase in self.samples}
+
+    def dump(self, path):  # writes the summary and every recorded tick, csv if the path ends in .csv otherwise json
+        columns = ["tick", "tick_time"] + list(self.phases)
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as dump_file:
+                writer = csv.writer(dump_file)
+                writer.writerow(columns)
+                writer.writerows(self.history)
+        else:
+            with open(path, "w") as dump_file:
+                json.dump({"summary_ms": self.summary(), "columns": columns, "ticks": list(self.history)}, dump_file)
+
+
+class CollisionGrid:  # sorts sprites into columns across the canvas so overlaps are only checked against nearby sprites
+    def __init__(self, canvas_width, column_width=100):
+        self.column_width = column_width
+        # each column maps the sprites in it to None, dicts keep the order sprites were added in unlike sets
+        self.columns = [{} for i in range(int(canvas_width // column_width) + 1)]
+        self.sprite_columns = {}  # maps each sprite to the first and last column its bounding box covers
+
+    def _column_range(self, x1, x2):  # columns covered by the horizontal extent of a bounding box
+        last_column = len(self.columns) - 1
+        first = min(max(int(x1 // self.column_width), 0), last_column)
+        last = min(max(int(x2 // self.column_width), 0), last_column)
+        return first, last
+
+    def update(self, sprite):  # moves a sprite into the columns covered by its bounding box, does nothing if unchanged
+        x1, y1, x2, y2 = sprite.bbox
+        columns = self._column_range(x1, x2)
+        previous_columns = self.sprite_columns.get(sprite)
+        if columns == previous_columns:
+            return
+        if previous_columns is not None:
+            for column in range(previous_columns[0], previous_columns[1] + 1):
+                del self.columns[column][sprite]
+        for column in range(columns[0], columns[1] + 1):
+            self.columns[column][sprite] = None
+        self.sprite_columns[sprite] = columns
+
+    def remove(self, sprite):  # removes a sprite from the grid
+        columns = self.sprite_columns.pop(sprite, None)
+        if columns is not None:
+            for column in range(columns[0], columns[1] + 1):
+                del self.columns[column][sprite]
+
+    def clear(self):
+        for column in self.columns:
+            column.clear()
+        self.sprite_columns.clear()
+
+    def columns_between(self, x1, x2):  # the columns covering a horizontal range, each maps its sprites to None
+        first, last = self._column_range(x1, x2)
+        return self.columns[first:last + 1]
+
+    def find_overlapping(self, x1, y1, x2, y2):  # finds the sprites touching or overlapping with a bounding box
+        first, last = self._column_range(x1, x2)
+        if first == last:  # a sprite is only stored once in each column
+            return [sprite for sprite in self.columns[first] if sprite.overlaps(x1, y1, x2, y2)]
+        overlapping = {}
+        for column in range(first, last + 1):
+            for sprite in self.columns[column]:
+                if sprite not in overlapping and sprite.overlaps(x1, y1, x2, y2):
+                    overlapping[sprite] = None
+        return list(overlapping)
+
+
+AI_UPDATE_BUDGET = 64  # AI updates per tick before far enemies are deferred when the AI level of detail is on
+
+
+class AIScheduler:  # decides which enemies run their movement AI each tick, enemies close to the player always do
+    def __init__(self, near_distance=25, far_period=4, update_budget=AI_UPDATE_BUDGET):
+        self.near_distance = near_distance  # enemies this close to the player's sprite run their AI every tick
+        self.far_period = far_period  # ticks between AI updates of enemies further away
+        self.update_budget = update_budget  # far enemies are spread over more ticks to keep under this many updates
+        self.tick = 0
+        self.new_enemies = []  # enemies created since the last tick, they run their AI on the next one
+        self.updates = 0
+        self.skipped = 0  # enemies that did not run their AI on a tick
+        self.deferred = 0  # far enemy updates put off to a later tick to keep within the budget
+
+    def due_enemies(self, sprite_list, player, collision_grid):  # the enemies that run their movement AI this tick
+        # far enemies are split into buckets by their place in the sprite list and only one bucket is taken each tick,
+        # so the skipped enemies are never looked at, the enemies near the player are found with the collision grid
+        self.tick += 1
+        enemy_count = len(sprite_list) - 1  # the player is always first
+        period = max(self.far_period, -(-enemy_count // self.update_budget))
+        due = set(sprite_list[1 + self.tick % period::period])
+        x1, y1, x2, y2 = player.bbox
+        for column in collision_grid.columns_between(x1 - self.near_distance, x2 + self.near_distance):
+            due.update(column)  # whole columns are taken, testing each enemy's distance would cost as much as its AI
+        due.update(self.new_enemies)
+        self.new_enemies.clear()
+        due.discard(player)
+        if period > self.far_period:  # over the budget, the far enemies whose turn it would have been have to wait
+            for enemy in sprite_list[1 + self.tick % self.far_period::self.far_period]:
+                if enemy not in due:
+                    self.deferred += 1
+        self.updates += len(due)
+        self.skipped += enemy_count - len(due)
+        return due
+
+
+class Timer:  # a callback scheduled on a TimerWheel
+    __slots__ = ("wheel", "due", "callback", "interval", "active")
+
+    def __init__(self, wheel, due, callback, interval):
+        self.wheel = wheel
+        self.due = due  # tick the callback is called on
+        self.callback = callback
+        self.interval = interval  # ticks between calls of a repeating timer, None if it only fires once
+        self.active = True
+
+    def cancel(self):  # the timer is skipped rather than removed from the wheel
+        self.active = False
+
+
+class TimerWheel:  # hierarchical timer wheel, each tick only touches the timers that are due on it
+    slot_bits = 6  # each level of the wheel has 64 slots
+
+    def __init__(self, levels=3):
+        self.tick = 0  # timers due on this tick fire when advance is next called
+        self.slot_count = 1 << self.slot_bits
+        self.levels = [[[] for _ in range(self.slot_count)] for _ in range(levels)]  # level n slots span 64 ** n ticks
+        self.overflow = []  # timers too far ahead for the wheel
+        self.fired = 0
+
+    def schedule(self, delay, callback, interval=None):  # calls callback after delay ticks, then every interval ticks
+        timer = Timer(self, self.tick + delay, callback, interval)
+        self._insert(timer)
+        return timer
+
+    def _insert(self, timer):  # places a timer in the lowest level that reaches its due tick
+        delay = timer.due - self.tick
+        for level, slots in enumerate(self.levels):
+            shift = self.slot_bits * level
+            if delay < self.slot_count << shift:
+                slots[(timer.due >> shift) & (self.slot_count - 1)].append(timer)
+                return
+        self.overflow.append(timer)
+
+    def advance(self):  # fires the timers due on the current tick then moves on to the next tick
+        slots = self.levels[0]
+        index = self.tick & (self.slot_count - 1)
+        while slots[index]:  # timers scheduled by callbacks for this tick fire as well
+            due_timers = slots[index]
+            slots[index] = []
+            for timer in due_timers:
+                if timer.active is False:
+                    continue
+                if timer.due > self.tick:  # not due until a later turn of the wheel
+                    self._insert(timer)
+                    continue
+                self.fired += 1
+                timer.callback()
+                if timer.interval is not None and timer.active is True:
+                    timer.due += timer.interval
+                    self._insert(timer)
+        self.tick += 1
+        for level in range(1, len(self.levels)):  # a lower level has turned over so the next slot above moves down
+            shift = self.slot_bits * level
+            if self.tick & ((1 << shift) - 1) != 0:
+                return
+            slots = self.levels[level]
+            index = (self.tick >> shift) & (self.slot_count - 1)
+            cascading_timers = slots[index]
+            slots[index] = []
+            for timer in cascading_timers:
+                if timer.active is True:
+                    self._insert(timer)
+        if self.tick & ((1 << (self.slot_bits * len(self.levels))) - 1) == 0:
+            overflow = self.overflow
+            self.overflow = []
+            for timer in overflow:
+                if timer.active is True:
+                    self._insert(timer)
+
+
+class BackgroundAnimator:  # animates the background with a frame cursor and a schedule worked out in advance
+    modes = ("animated", "reduced", "static")  # reduced and static change the frame less often for low power hosts
+    reduced_rate = 4  # in reduced mode only every fourth frame is displayed, each for four times as long
+
+    def __init__(self, ticks_per_frame, mode="animated", timers=None):
+        if mode not in self.modes:
+            raise ValueError("background mode must be one of {}".format(", ".join(self.modes)))
+        self.ticks_per_frame = int(ticks_per_frame)
+        self.mode = mode
+        self.timers = timers if timers is not None else TimerWheel()  # the next frame change is scheduled here
+        self.timer = None
+        self.frames = []
+        self.schedule = []  # index of the frame displayed on each tick of one loop of the animation
+        self.changes = []  # position in the schedule and frame index of each change of frame
+        self.frame_index = None  # index of the displayed frame, None until the first frame is displayed
+        self.next_change = 0  # index into changes of the change the timer makes next
+        self.frame_changes = 0  # number of times the displayed frame has changed
+        self.change_time = 0.0  # seconds spent changing frames, they change in timer callbacks rather than every tick
+
+    def set_frames(self, frames):  # sets the frames of the animation and works out the schedule for them
+        self.frames = frames
+        self.frame_index = None
+        self.next_change = 0
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not frames:
+            self.schedule = []
+        elif self.mode == "static":
+            self.schedule = [0]
+        elif self.mode == "reduced":
+            ticks = self.ticks_per_frame * self.reduced_rate
+            self.schedule = [(i // ticks) * self.reduced_rate for i in range(len(frames) * self.ticks_per_frame)]
+        else:
+            self.schedule = [i // self.ticks_per_frame for i in range(len(frames) * self.ticks_per_frame)]
+        self.changes = [(tick, frame_index) for tick, frame_index in enumerate(self.schedule)
+                        if tick == 0 or frame_index != self.schedule[tick - 1]]
+        if self.changes:
+            self.timer = self.timers.schedule(0, lambda: self.change_frame(0))  # first frame is shown this tick
+
+    @property
+    def current_frame(self):
+        if self.frame_index is None:
+            return ""
+        return self.frames[self.frame_index]
+
+    def change_frame(self, change):  # displays a frame and schedules the change after it
+        start_time = time.perf_counter()
+        tick, self.frame_index = self.changes[change]
+        self.frame_changes += 1
+        if len(self.changes) > 1:
+            next_change = (change + 1) % len(self.changes)
+            delay = (self.changes[next_change][0] - tick) % len(self.schedule)
+            self.next_change = next_change
+            self.timer = self.timers.schedule(delay, lambda: self.change_frame(next_change))
+        else:
+            self.timer = None
+        self.change_time += time.perf_counter() - start_time
+
+    def save_state(self):  # displayed frame, next change and ticks until it as a tuple of BACKGROUND_STATE fields
+        frame_index = self.frame_index if self.frame_index is not None else -1
+        timer = self.timer if self.timer is not None and self.timer.active is True else None
+        return frame_index, self.next_change, timer.due - timer.wheel.tick if timer is not None else -1
+
+    def load_state(self, state):  # restores a tuple from save_state, the frames must already be set
+        frame_index, next_change, delay = state
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.frame_index = frame_index if frame_index >= 0 else None
+        self.next_change = next_change
+        if delay >= 0:
+            self.timer = self.timers.schedule(delay, lambda: self.change_frame(next_change))
+
+
+Wave = collections.namedtuple("Wave", ["enemies", "spawn_interval", "concurrent_cap", "type_weights"])
+# enemies spawned over the wave, ticks between spawns, most enemies alive at once, chances of sprite types 2, 3 and 4
+HORDE_WAVES = (
+    Wave(20, 25, 8, (6, 3, 1)),
+    Wave(60, 10, 30, (5, 4, 2)),
+    Wave(150, 4, 100, (4, 4, 3)),
+    Wave(400, 1, 320, (3, 4, 4)),
+)
+
+
+class HordeSpawner:  # spawns enemies in escalating waves rather than replacing each defeated enemy
+    escalation = 1.5  # waves after the last defined wave grow by this much each time
+
+    def __init__(self, game, waves=HORDE_WAVES):
+        self.game = game
+        self.waves = waves
+        self.wave_number = 0  # waves started this round, the first wave is 1
+        self.wave = None  # Wave being played, None when no round is being played
+        self.spawned = 0  # enemies spawned in this wave
+        self.defeated = 0  # enemies defeated in this wave
+        self.timer = None  # spawns an enemy every spawn_interval ticks
+
+    def wave_definition(self, wave_number):  # the defined wave or an escalation of the last defined wave
+        if wave_number <= len(self.waves):
+            return self.waves[wave_number - 1]
+        wave = self.waves[-1]
+        extra_waves = wave_number - len(self.waves)
+        growth = self.escalation ** extra_waves
+        type_weights = wave.type_weights[:-1] + (wave.type_weights[-1] + extra_waves,)  # more of the toughest type
+        return Wave(int(wave.enemies * growth), wave.spawn_interval, int(wave.concurrent_cap * growth), type_weights)
+
+    def start(self, first_wave=1):  # later first waves make the round harder from the start
+        self.wave_number = first_wave - 1
+        self.next_wave()
+
+    def next_wave(self):
+        self.wave_number += 1
+        self.wave = self.wave_definition(self.wave_number)
+        self.spawned = 0
+        self.defeated = 0
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = self.game.timers.schedule(0, self.spawn, self.wave.spawn_interval)
+
+    def spawn(self):  # called by the spawn timer, spawns an enemy unless the wave is over its cap
+        wave = self.wave
+        if self.spawned < wave.enemies and self.spawned - self.defeated < wave.concurrent_cap:
+            self.game.create_enemy(sprite_type=self.game.random.choices((2, 3, 4), wave.type_weights)[0])
+            self.spawned += 1
+
+    def enemy_defeated(self):  # the next wave starts once every enemy of this wave has been defeated
+        self.defeated += 1
+        if self.defeated >= self.wave.enemies:
+            self.next_wave()
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.wave = None
+
+    def save_state(self):  # wave, enemies spawned and defeated and ticks until the next spawn as HORDE_STATE fields
+        delay = self.timer.due - self.timer.wheel.tick if self.timer is not None and self.wave is not None else -1
+        return self.wave_number, self.spawned, self.defeated, delay
+
+    def load_state(self, state):  # restores a tuple from save_state, the spawn timer is scheduled on the game's timers
+        wave_number, spawned, defeated, delay = state
+        self.stop()
+        self.wave_number = wave_number
+        self.spawned = spawned
+        self.defeated = defeated
+        if delay >= 0:  # a round was being played
+            self.wave = self.wave_definition(wave_number)
+            self.timer = self.game.timers.schedule(delay, self.spawn, self.wave.spawn_interval)
+
+
+class EnemyPool:  # keeps defeated enemies so they can be respawned instead of building new ones
+    def __init__(self, size, canvas_width, canvas_height):
+        self.size = size  # most enemies kept for reuse, 0 turns the pool off
+        self.canvas_width = canvas_width
+        self.canvas_height = canvas_height
+        self.free = []
+        self.hits = 0  # enemies taken from the pool
+        self.misses = 0  # enemies built because the pool was empty
+
+    @property
+    def allocations_avoided(self):  # every hit is an Enemy that did not have to be built
+        return self.hits
+
+    def acquire(self, sprite_type):  # respawns a pooled enemy, or builds one if there are none
+        if self.free:
+            self.hits += 1
+            enemy = self.free.pop()
+            enemy.respawn(sprite_type)
+            return enemy
+        self.misses += 1
+        return Enemy(self.canvas_width, self.canvas_height, sprite_type)
+
+    def release(self, enemy):  # keeps a removed enemy if the pool is not full
+        if len(self.free) < self.size:
+            self.free.append(enemy)
+
+
+class Game:  # contains methods and attributes for playing the game, the game state never depends on a canvas
+    def __init__(self, canvas_height, canvas_width, background_animation_speed, enemy_batch=False,
+                 background_mode="animated", seed=None, enemy_pool_size=16, ai_lod=False,
+                 ai_update_budget=AI_UPDATE_BUDGET, horde=False):
         self.canvas_height = canvas_height
         self.canvas_width = canvas_width
+        self.timers = TimerWheel()  # animation frames and other periodic events of the game are scheduled here
+        self.random = random.Random(seed)  # every random choice in the game comes from here so a seed repeats a game
+        self.enemy_batch = None  # when enemies are batched their state is stored in numpy arrays
+        if enemy_batch is True:
+            self.enemy_batch = EnemyBatch(self)
+        self.enemy_pool = EnemyPool(enemy_pool_size, canvas_width, canvas_height)  # batched enemies reuse slots
         self.background_animation_speed = background_animation_speed / 10  # converts from milliseconds to s/10
-        self._background_iteration_period = self.background_animation_speed
+        self.background_animator = BackgroundAnimator(self.background_animation_speed, background_mode, self.timers)
         self.background_image_list = []  # stores frame images for background
-        self.current_background_image = ""  # reassigned to currently displayed background image
-        self.background_image = self.canvas.create_image(0, 0, image="", anchor=NW)
+        self.background_time = 0.0  # seconds spent animating the background this round
+        self.profiler = None  # TickProfiler that times each phase of a tick when profiling
+        self.ticks = 0  # ticks played this round
         self.sprite_list = []  # sprite instances that are active in game are appended here
+        self.collision_grid = CollisionGrid(self.canvas_width)  # sprites are added when they first move
+        self.ai_scheduler = None  # when set enemies far from the player run their AI less often
+        if ai_lod is True and enemy_batch is False:
+            self.ai_scheduler = AIScheduler(update_budget=ai_update_budget)
+        self.horde = None  # in horde mode enemies are spawned in waves instead of replacing defeated enemies
+        if horde is True:
+            self.horde = HordeSpawner(self)
         self.player_image_list_right = []  # contains images for the player (sprite_type = 1) right movement
         self.player_image_list_left = []  # contains images for the player (sprite_type = 1) left movement
         self.enemy_image_list_right = []  # contains images for enemy animations for right movement
@@ -86,54 +713,56 @@ class Game:  # contains methods and attributes for playing the game
         self.health_bar_left_margin = 10
         self._health_bar_default_width = (self.canvas_width / 2) - self.health_bar_left_margin  # remove 10 to account for left margin of 10
         self._health_bar_default_height = 30
-        self.health_bar_rectangle_red = None  # will be reassigned a red rectangle object
-        self.health_bar_rectangle_green = None  # will be reassigned a green rectangle object to indicate health
+        self.health_bar_visible = False  # when True the red and green health bars are displayed
+        self.health_bar_width = self._health_bar_default_width  # right edge of the green bar that indicates health
         self.score = 0
 
-    def change_background_image(self):  # animates the background image
-        current_image = str(self.current_background_image)
-        for i in range(len(self.background_image_list)):  # length of animation
-            if current_image == str(self.background_image_list[i]) and self._background_iteration_period == \
-                    self.background_animation_speed:  # controls frame rate of image change over
-                if (i + 1) == len(self.background_image_list):  # if image will be last in list reset animation
-                    self.canvas.itemconfig(self.background_image, image=self.background_image_list[0])
-                    self.current_background_image = self.background_image_list[0]
-                else:
-                    self.canvas.itemconfig(self.background_image, image=self.background_image_list[(i + 1)])
-                    self.current_background_image = self.background_image_list[(i + 1)]
-                self._background_iteration_period = 0   # reseting this value means next image change will be at the same frame rate as the last
-            elif current_image == "" and self._background_iteration_period == self.background_animation_speed:
-                # if current image is default value "" then start animation
-                self.canvas.itemconfig(self.background_image, image=self.background_image_list[0])
-                self.current_background_image = self.background_image_list[0]
-                self._background_iteration_period = 0
-        self._background_iteration_period += 1
+    @property
+    def health_bar_coords(self):  # coordinates of the red bar, the green bar shares these up to health_bar_width
+        return [self.health_bar_left_margin, 10, self._health_bar_default_width, 35]
+
+    @property
+    def current_background_image(self):  # currently displayed background image
+        return self.background_animator.current_frame
+
+    def change_background_image(self):  # animates the background image, the frames change on the timer wheel
+        if self.background_animator.frames is not self.background_image_list:  # frames have been loaded or replaced
+            self.background_animator.set_frames(self.background_image_list)
 
     def create_player(self):  # creates the player sprite
         default_health = 100
-        player = Player(self.canvas, self.canvas_width, self.canvas_height, default_health)
+        player = Player(self.canvas_width, self.canvas_height, default_health)
         player.health = (0, default_health)  # sets the health value
         player.attack_damage = 25  # sets the attack damage value
         player.set_images(self.player_image_list_right, self.player_image_list_left)
+        player.start_animation(self.timers)
         self.sprite_list.append(player)
         return player
 
-    def create_enemy(self, difficulty):
-        if difficulty > 1:  # difficulty determines the types of enemies that the player will face
-            sprite_type = random.randint(difficulty, 4)  # greater difficulty reduces range of difficult enemies
-        else:
+    def create_enemy(self, difficulty=None, sprite_type=None):  # the sprite type comes from the difficulty if not given
+        if sprite_type is None and difficulty > 1:  # difficulty determines the types of enemies the player will face
+            sprite_type = self.random.randint(difficulty, 4)  # greater difficulty reduces range of difficult enemies
+        elif sprite_type is None:
             sprite_type = 2  # sprite type cannot be 1 as a player is always sprite type 1
-        enemy = Enemy(self.canvas, self.canvas_width, self.canvas_height, sprite_type)
+        if self.enemy_batch is not None:
+            enemy = self.enemy_batch.add(sprite_type)
+        else:
+            enemy = self.enemy_pool.acquire(sprite_type)
         # set enemy specific images based off sprite_type
         enemy.set_images(self.enemy_image_list_right, self.enemy_image_list_left)
+        enemy.start_animation(self.timers)
         self.sprite_list.append(enemy)
+        if self.ai_scheduler is not None:  # a new enemy runs its AI on its first tick wherever it is
+            self.ai_scheduler.new_enemies.append(enemy)
 
     def display_sprites(self, index):  # spawns sprites in the game at certain locations
-        sprite = self.sprite_list[index]
+        self.spawn_sprite(self.sprite_list[index], index != 0)
+
+    def spawn_sprite(self, sprite, is_enemy):  # spawns a sprite that is not visible yet, the player is not an enemy
         if sprite.visibility is False:  # determines if sprite is visible
             directions = ["right", "left"]  # directions can only be left or right
-            if index != 0:  # if sprite is not player
-                enemy_sprite_direction = random.choice(directions)
+            if is_enemy:  # if sprite is not player
+                enemy_sprite_direction = self.random.choice(directions)
                 if enemy_sprite_direction == directions[0]:
                     coordinates = 0  # spawns enemy at left side of screen
                 else:
@@ -141,73 +770,293 @@ class Game:  # contains methods and attributes for playing the game
                 sprite.display_sprite(enemy_sprite_direction, image_index=0,
                                       x_coordinates=coordinates)
             else:  # spawns player sprite in center of canvas
-                sprite.display_sprite(random.choice(directions), image_index=0,
+                sprite.display_sprite(self.random.choice(directions), image_index=0,
                                       x_coordinates=self.canvas_width / 2)
             sprite.visibility = True  # stops sprites from being 'spawned' again
 
     def display_health_bar(self):  # displays the health bar
         # red indicates loss of health, green indicates health remaining
-        coordinates_list = [10, 10, self._health_bar_default_width, 35]
-        self.health_bar_rectangle_red = self.canvas.create_rectangle(*coordinates_list, fill="red")
-        self.health_bar_rectangle_green = self.canvas.create_rectangle(*coordinates_list, fill="green")
+        self.health_bar_visible = True
+        self.health_bar_width = self._health_bar_default_width
 
-    def update_health_bar(self, player):  # updates the player health bar by configuring the coords of the green bar
-        health_bar_coords = self.canvas.coords(self.health_bar_rectangle_green)
+    def update_health_bar(self, player):  # updates the player health bar by changing the width of the green bar
         if player.health != player.default_health > 0:  # game is currently playing and damage has been taken
-            new_health = int(self._health_bar_default_width - ((self._health_bar_default_width / 100) *
-                                                               (player.default_health - player.health)))
-            self.canvas.coords(self.health_bar_rectangle_green, health_bar_coords[0], health_bar_coords[1], new_health,
-                               health_bar_coords[3])
+            self.health_bar_width = int(self._health_bar_default_width - ((self._health_bar_default_width / 100) *
+                                                                          (player.default_health - player.health)))
         else:  # game has ended as health is 0 or less so position of health bar must be reset
-            self.canvas.coords(self.health_bar_rectangle_green, self.health_bar_left_margin, health_bar_coords[1],
-                               self._health_bar_default_width, health_bar_coords[3])
+            self.health_bar_width = self._health_bar_default_width
 
     def update_score(self, enemy_dead, enemy):  # adds the defeated enemies health value to the score
         if enemy_dead is True:
             self.score += enemy.sprite_type * 25  # same method for calculating enemy health
 
-    def find_overlapping(self, player, enemy):  # checks if player is overlapping with enemies
-        enemy_bbox = self.canvas.bbox(enemy.sprite_object_image)
-        overlapping = self.canvas.find_overlapping(*enemy_bbox)
-        return overlapping
+    def find_overlapping(self, player):  # finds the enemies touching the player with one query of the collision grid
+        # enemies only interact with the player, so the enemies crowded around each other are never checked
+        return set(self.collision_grid.find_overlapping(*player.bbox))
+
+    def replace_enemy(self, difficulty):  # replaces a defeated enemy, in horde mode the waves spawn enemies instead
+        if self.horde is not None:
+            self.horde.enemy_defeated()
+        else:
+            self.create_enemy(difficulty)
 
     def enemy_attack(self, player, enemy):
         enemy.attack_action(None)  # parameter None passed in place of event parameter filled when player calls function with kepress event
-        if enemy.current_image_index == enemy.final_attack_image_index and enemy.image_iteration_period == enemy.animation_speed:  # attack animation is finishing
+        if enemy.current_image_index == enemy.final_attack_image_index and enemy.frame_ending:  # attack animation is finishing
             player.health = (1, enemy.attack_damage)
 
     def sprite_interaction(self, player, enemy, overlapping):
         # determines effects on player / enemy depending on sprite attributes when the objects are overlapping
-        if player.sprite_object_image in overlapping:
+        if overlapping is True:
             if player.duck is not True and player.attack is not True:  # enemy can attack and guarentee damage
                 self.enemy_attack(player, enemy)
             elif player.attack is True:  # the enemy may decide to duck or attack back, includes randomness in gameplay
-                random_action = random.randint(0, 1)  # can only be either attack or duck
+                random_action = self.random.randint(0, 1)  # can only be either attack or duck
                 if random_action == 0:
                     enemy.duck_action(None)
                 else:
                     self.enemy_attack(player, enemy)
 
-            if player.attack is True and player.image_iteration_period == player.animation_speed and \
+            if player.attack is True and player.frame_ending and \
                     player.current_image_index == player.final_attack_image_index and enemy.previous_direction != player.previous_direction \
                     and enemy.duck is not True:  # checks attack animation has completed before damage
                 enemy.health = (1, player.attack_damage)
 
     def remove_sprite(self, remove_sprite, sprite):  # removes instances of a sprite from the game
         if remove_sprite is True:
-            self.canvas.delete(sprite.sprite_object_image)
             self.sprite_list.remove(sprite)
+            self.collision_grid.remove(sprite)
+            sprite.stop_animation()
+            if isinstance(sprite, BatchEnemy):  # frees the slot of the enemy in the batch
+                self.enemy_batch.remove(sprite)
+            elif isinstance(sprite, Enemy):  # the enemy can be respawned by create_enemy
+                self.enemy_pool.release(sprite)
             del sprite  # deletes sprite instance
 
+    def update(self, player, difficulty):  # runs one tick of the game while it is being played
+        profiler = self.profiler  # every lap is skipped when not profiling
+        if profiler is not None:
+            profiler.begin_tick()
+        self.ticks += 1
+        start_time = time.perf_counter()
+        self.change_background_image()  # animate background image
+        self.background_time += time.perf_counter() - start_time
+        if profiler is not None:
+            profiler.lap("background")
+        if self.enemy_batch is not None:  # every enemy is updated at once
+            self.enemy_batch.update(player, difficulty)
+        else:
+            self.update_sprites(player, difficulty)
+        self.update_health_bar(player)  # updates the health bar once per tick
+        if profiler is not None:
+            profiler.lap("health_bar")
+        change_time = self.background_animator.change_time
+        self.timers.advance()  # steps the animations whose frame has ended this tick
+        change_time = self.background_animator.change_time - change_time  # background frames change on the wheel
+        self.background_time += change_time
+        if self.enemy_batch is not None:
+            self.enemy_batch.animate()
+        if profiler is not None:
+            profiler.lap("timers")
+            profiler.move("timers", "background", change_time)
+            profiler.end_tick()
+
+    def update_sprites(self, player, difficulty):  # moves the sprites and works out their interactions one at a time
+        profiler = self.profiler
+        ai_scheduler = self.ai_scheduler
+        ai_due = None  # enemies that run their AI this tick, worked out once the player has moved
+        for i in range(len(self.sprite_list)):
+            self.display_sprites(i)
+            if self.sprite_list[i] != player:  # controls actions of enemies in game
+                enemy = self.sprite_list[i]  # stores enemy
+                if ai_due is None or enemy in ai_due:
+                    if profiler is not None:
+                        profiler.lap("movement")
+                    enemy_velocity_change = enemy.calculate_movement(player)
+                    enemy.change_movement(enemy_velocity_change)
+                    if profiler is not None:
+                        profiler.lap("enemy_ai")
+                enemy.move()  # moves enemy based on calculated dynamic movement in response to player actions
+                if profiler is not None:
+                    profiler.lap("movement")
+                self.collision_grid.update(enemy)
+                if profiler is not None:
+                    profiler.lap("collision")
+            else:
+                player.move()
+                if profiler is not None:
+                    profiler.lap("movement")
+                self.collision_grid.update(player)
+                if profiler is not None:
+                    profiler.lap("collision")
+                if ai_scheduler is not None:
+                    ai_due = ai_scheduler.due_enemies(self.sprite_list, player, self.collision_grid)
+                    if profiler is not None:
+                        profiler.lap("enemy_ai")
+        # once every sprite has moved the grid is queried once for the enemies touching the player, like batched enemies
+        overlapping = self.find_overlapping(player)
+        if profiler is not None:
+            profiler.lap("collision")
+        defeated = []
+        for enemy in self.sprite_list:
+            if enemy != player:
+                self.sprite_interaction(player, enemy, enemy in overlapping)  # determines interactions between player and enemy depending on if they are overlapping
+                if enemy.health <= 0:  # removed once every enemy has been updated so no enemy misses this tick
+                    defeated.append(enemy)
+        if profiler is not None:
+            profiler.lap("interaction")
+        for enemy in defeated:
+            self.update_score(True, enemy)  # updates score as enemy is defeated
+            self.remove_sprite(True, enemy)  # removes defeated enemy
+            self.replace_enemy(difficulty)
+        if profiler is not None:
+            profiler.lap("score_removal")
+
+    def save_state(self):  # packs the simulation state of the round into bytes, see load_state
+        if self.enemy_batch is not None:
+            raise ValueError("snapshots are not supported with batched enemies")
+        version, internal_state, gauss_next = self.random.getstate()
+        ai_scheduler = self.ai_scheduler
+        state = [GAME_STATE.pack(self.ticks, self.score, self.timers.tick,
+                                 ai_scheduler.update_budget if ai_scheduler is not None else 0,
+                                 ai_scheduler.tick if ai_scheduler is not None else 0,
+                                 len(ai_scheduler.new_enemies) if ai_scheduler is not None else 0,
+                                 self.health_bar_visible, len(self.sprite_list)),
+                 BACKGROUND_STATE.pack(*self.background_animator.save_state()),
+                 RANDOM_STATE.pack(*internal_state, gauss_next is not None, gauss_next or 0.0)]
+        if self.horde is not None:
+            state.append(HORDE_STATE.pack(*self.horde.save_state()))
+        state.extend(sprite.save_state() for sprite in self.sprite_list)  # the player is always first
+        return b"".join(state)
+
+    def load_state(self, state, offset=0):  # replaces the round with one packed by save_state
+        if self.enemy_batch is not None:
+            raise ValueError("snapshots are not supported with batched enemies")
+        ticks, self.score, tick, ai_update_budget, ai_tick, new_enemies, self.health_bar_visible, sprite_count = \
+            GAME_STATE.unpack_from(state, offset)
+        offset += GAME_STATE.size
+        # enemies in the game are restored in place, more are taken from the pool or the extra ones are removed
+        for enemy in self.sprite_list[max(sprite_count, 1):]:
+            self.remove_sprite(True, enemy)
+        if not self.sprite_list:  # the round had ended, its player has been removed
+            self.create_player()
+        self.ticks = ticks
+        # every timer is scheduled again from the snapshot on a new wheel at the tick it was saved on
+        self.timers = TimerWheel()
+        self.timers.tick = tick
+        self.background_animator.timers = self.timers
+        # the AI level of detail and its budget are restored as they were saved rather than taken from this game
+        if ai_update_budget == 0:
+            self.ai_scheduler = None
+        elif self.ai_scheduler is None or self.ai_scheduler.update_budget != ai_update_budget:
+            self.ai_scheduler = AIScheduler(update_budget=ai_update_budget)
+        if self.ai_scheduler is not None:
+            self.ai_scheduler.tick = ai_tick
+        self.change_background_image()  # sets the frames if they have not been set yet
+        self.background_animator.load_state(BACKGROUND_STATE.unpack_from(state, offset))
+        offset += BACKGROUND_STATE.size
+        random_state = RANDOM_STATE.unpack_from(state, offset)
+        self.random.setstate((3, random_state[:625], random_state[626] if random_state[625] else None))
+        offset += RANDOM_STATE.size
+        if self.horde is not None:
+            self.horde.load_state(HORDE_STATE.unpack_from(state, offset))
+            offset += HORDE_STATE.size
+        for i in range(sprite_count):
+            if i == len(self.sprite_list):
+                self.create_enemy(sprite_type=state[offset])  # the sprite type is the first field of a sprite
+            offset = self.sprite_list[i].load_state(state, offset, self.timers)
+        if self.ai_scheduler is not None:  # enemies created last are the ones that have not run their AI yet
+            self.ai_scheduler.new_enemies = self.sprite_list[len(self.sprite_list) - new_enemies:]
+        # the AI finds the enemies near the player in the grid, so it holds every sprite as it did when saved
+        self.collision_grid.clear()
+        for sprite in self.sprite_list:
+            self.collision_grid.update(sprite)
+        self.update_health_bar(self.sprite_list[0])
+
     def reset(self):  # resets some of the game attributes to defaults for replayability
         initial_length = len(self.sprite_list)
         # length of sprite_list will change as sprites are removed so initial length is stored
         for i in range(initial_length):  # initial length is used as sprite list length varies as sprites removed
             self.remove_sprite(True, self.sprite_list[0])
-        self.canvas.delete(self.health_bar_rectangle_red, self.health_bar_rectangle_green)  # remove health bars
+        self.health_bar_visible = False  # remove health bars
+        if self.horde is not None:
+            self.horde.stop()
+        if self.ai_scheduler is not None:
+            self.ai_scheduler.new_enemies.clear()
+        self.background_time = 0.0
+        self.background_animator.frame_changes = 0
+        self.ticks = 0
+
+
+FRAME_NEXT, FRAME_END_DUCK, FRAME_END_ATTACK = range(3)  # what happens when a frame of an animation has been shown
+SPRITE_STATE = struct.Struct("<BdfHQ??bbBBh?b")
+# sprite type, x, y, x velocities stacked, a bit for each set when it is positive, facing left, event, attack, duck,
+# duck delay, image index, health, visibility, ticks until the frame timer fires (-1 without one)
+# velocities past the 64th are rare, their bits follow in as many bytes as they need
+ACTION_STATES = (None, False, True)  # attack and duck are stored as an index into this
+GAME_STATE = struct.Struct("<IIIIII?I")
+# ticks this round, score, timer wheel tick, AI update budget (0 without the AI level of detail), AI scheduler tick,
+# enemies that have not run their AI yet, health bar visible, number of sprites
+BACKGROUND_STATE = struct.Struct("<hHh")  # frame index (-1 for none), next change, ticks until it (-1 for none)
+HORDE_STATE = struct.Struct("<HIIh")  # wave number, enemies spawned, enemies defeated, ticks until the next spawn
+RANDOM_STATE = struct.Struct("<625I?d")  # the mersenne twister state of the game's random.Random, gauss_next
+
+
+class BufferedLogger:  # keeps log lines in memory and writes them out together, does nothing until given an output
+    def __init__(self, output=None, max_lines=1000):
+        self.output = output  # file the lines are written to, None turns logging off
+        self.max_lines = max_lines  # lines kept before they are written
+        self.lines = []
+
+    def log(self, message, *args):  # the message is only formatted when logging is on
+        if self.output is None:
+            return
+        self.lines.append(message.format(*args))
+        if len(self.lines) >= self.max_lines:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            self.output.write("\n".join(self.lines) + "\n")
+            self.output.flush()
+            self.lines = []
+
+
+class SpriteAnimation:  # the walk, duck and attack clips of a sprite's frames worked out once as a transition table
+    def __init__(self, walk, duck, attack):  # first and final frame index of each clip
+        self.walk = walk
+        self.duck = duck
+        self.attack = attack
+        frame_count = max(walk[1], duck[1], attack[1]) + 1
+        self.transitions = [(index, FRAME_NEXT) for index in range(frame_count)]  # next frame and what happens
+        for first, final in (walk, duck, attack):
+            for index in range(first, final):
+                self.transitions[index] = (index + 1, FRAME_NEXT)
+        self.transitions[walk[1]] = (walk[0], FRAME_NEXT)  # walking loops
+        self.transitions[duck[1]] = (walk[0], FRAME_END_DUCK)  # actions go back to walking when they end
+        self.transitions[attack[1]] = (walk[0], FRAME_END_ATTACK)
 
 
 class Sprite:  # contains attributes and methods for a sprite
+    __slots__ = ("canvas_width", "canvas_height", "sprite_type", "var_health", "var_attack_damage", "velocity",
+                 "previous_direction", "event", "attack", "duck", "duck_delay", "current_image",
+                 "current_image_index", "image_list_right", "image_list_left", "x", "y", "frame_timer",
+                 "visibility")  # sprites have no __dict__ so large numbers of enemies use less memory
+    # all image assets for sprites must be stored as follows
+    # 0, 5 walking & 6, 7 ducking & 8, 11 attacking
+    animation = SpriteAnimation(walk=(0, 5), duck=(6, 7), attack=(8, 11))
+    default_image_index = animation.walk[0]
+    final_walk_image_index = animation.walk[1]
+    first_duck_image_index = animation.duck[0]
+    final_duck_image_index = animation.duck[1]
+    first_attack_image_index = animation.attack[0]
+    final_attack_image_index = animation.attack[1]
+    ducking_period = 3  # default amount duck_delay must reach when ducking
+    image_width = 100  # image width by default should be 100
+    image_height = 100
+    collision_width = 95  # every sprite frame is 95 pixels wide, the extent canvas.bbox gave the image for collisions
+    animation_speed = 10  # animation speed of a sprite is constant
+
     def __init__(self, sprite_type):
         self.sprite_type = sprite_type  # determines some sprite attributes
         self.var_health = 0
@@ -218,28 +1067,20 @@ class Sprite:  # contains attributes and methods for a sprite
         self.attack = None
         self.duck = None
         self.duck_delay = 0  # is incremented and reassigned to create a delay when a duck action is prompted
-        self.ducking_period = 3  # default amount duck_delay must reach when ducking
         self.current_image = None  # stores the current image
-        self.default_image_index = 0
         self.current_image_index = self.default_image_index  # stores the current image index for determining next frame of animation
-        self.final_walk_image_index = 5
-        self.first_duck_image_index = 6
-        self.final_duck_image_index = 7
-        self.first_attack_image_index = 8
-        self.final_attack_image_index = 11
         self.image_list_right = []  # stores images for right movement
         self.image_list_left = []  # stores images for left movement
-        self.image_width = 100  # image width by default should be 100
-        self.sprite_object_image = None  # stores the canvas image that will be moved in the game
-        self.animation_speed = 10  # animation speed of a sprite is constant
-        self.image_iteration_period = self.animation_speed
+        self.x = 0  # left edge of the sprite, sprites are anchored at their bottom left corner
+        self.y = self.canvas_height  # bottom edge of the sprite
+        self.frame_timer = None  # fires every animation_speed ticks to step the animation
         self.visibility = False  # when True the sprite has been spawned
 
     def set_images(self, images_right, images_left):  # reassigns the image lists of the parent class
         self.image_list_right = images_right
         self.image_list_left = images_left
 
-    def display_sprite(self, direction, image_index, x_coordinates):  # spawns and displays the sprite pn canvas
+    def display_sprite(self, direction, image_index, x_coordinates):  # spawns the sprite at the given coordinates
         if direction == "right":  # direction determines image direction displayed
             for i in range(len(self.image_list_right)):
                 if image_index == i:  # gets the current desired image index for display
@@ -250,9 +1091,15 @@ class Sprite:  # contains attributes and methods for a sprite
                 if image_index == i:  # gets the current desired image index for display
                     self.current_image = self.image_list_left[i]
                     self.current_image_index = i
-        # reassigns variable to value of canvas image created here, this is the object that will be animated and moved
-        self.sprite_object_image = self.canvas.create_image(x_coordinates, self.canvas_height, image=self.current_image,
-                                                            anchor=SW)
+        self.x = x_coordinates
+        self.y = self.canvas_height
+
+    @property
+    def bbox(self):  # bounding box of the sprite as x1, y1, x2, y2
+        return self.x, self.y - self.image_height, self.x + self.collision_width, self.y
+
+    def overlaps(self, x1, y1, x2, y2):  # checks if the sprite touches or overlaps with a bounding box
+        return self.x <= x2 and self.x + self.collision_width >= x1 and self.y - self.image_height <= y2 and self.y >= y1
 
     @property
     def health(self):
@@ -273,21 +1120,35 @@ class Sprite:  # contains attributes and methods for a sprite
     def attack_damage(self, attack_damage):
         self.var_attack_damage = attack_damage
 
-    def move(self):  # controls movement and prompts animation changes dependant on the sprites movement
-        if abs(self.velocity[-1]) >= 0 and self.canvas_width - self.image_width >= self.canvas.coords(self.sprite_object_image)[0]\
-                + self.velocity[-1] >= 0:
+    def move(self):  # controls movement, attacking and ducking stop the sprite from moving
+        if abs(self.velocity[-1]) >= 0 and self.canvas_width - self.image_width >= self.x + self.velocity[-1] >= 0:
             if self.velocity[-1] == self.x_velocity_constant and self.attack is not True and self.duck is not True:
                 self.previous_direction = "right"
-                self.canvas.move(self.sprite_object_image, self.velocity[-1], self.velocity[0])
-                self.sprite_image = self.current_image_index
+                self.x += self.velocity[-1]
+                self.y += self.velocity[0]
             elif self.velocity[-1] == -self.x_velocity_constant and self.attack is not True and self.duck is not True:
                 self.previous_direction = "left"
-                self.canvas.move(self.sprite_object_image, self.velocity[-1], self.velocity[0])
-                self.sprite_image = self.current_image_index
-            elif self.attack is True:  # stops movement and animates the attack action
-                self.sprite_image = self.current_image_index
-            elif self.duck is True:  # stops movement and animates the ducking action
-                self.sprite_image = self.current_image_index
+                self.x += self.velocity[-1]
+                self.y += self.velocity[0]
+
+    @property
+    def animating(self):  # sprites animate while they walk within the canvas or while they attack or duck
+        if not self.canvas_width - self.image_width >= self.x + self.velocity[-1] >= 0:
+            return False
+        return self.attack is True or self.duck is True or abs(self.velocity[-1]) == self.x_velocity_constant
+
+    @property
+    def frame_ending(self):  # True on the last tick the current frame is displayed for
+        return self.frame_timer is not None and self.frame_timer.due == self.frame_timer.wheel.tick
+
+    def start_animation(self, timers):  # registers the frame timer of the sprite on the timer wheel
+        self.stop_animation()
+        self.frame_timer = timers.schedule(0, self.next_frame, self.animation_speed)
+
+    def stop_animation(self):
+        if self.frame_timer is not None:
+            self.frame_timer.cancel()
+            self.frame_timer = None
 
     def attack_action(self, event):  # called with keypress of space if sprite is player hence event parameter
         if self.event is False:  # if ducking action is not occurring
@@ -303,75 +1164,100 @@ class Sprite:  # contains attributes and methods for a sprite
             self.event = True  # prevent attacking action from occurring
             self.current_image_index = self.first_duck_image_index
 
-    @property
-    def sprite_image(self):
-        return self.current_image
-
-    @sprite_image.setter
-    def sprite_image(self, index):  # animates sprite by changing the current image of the sprite canvas image object
-        if self.image_iteration_period == self.animation_speed:
-            if index < self.final_walk_image_index:  # if sprite is walking
-                self.current_image_index = index + 1
-            elif index == self.final_walk_image_index:  # if end of walking animation is reached
-                self.current_image_index = self.default_image_index  # resets walking animation
-            elif self.first_duck_image_index <= index < self.final_duck_image_index:  # animate ducking action
-                self.current_image_index = index + 1
-            elif index == self.final_duck_image_index and self.duck_delay == self.ducking_period:  # end ducking action if delay has passed
-                self.current_image_index = self.default_image_index  # resets animation to walking
-                self.event = False  # cancels the action so attack or duck can occur again
-                self.duck = False
-                self.duck_delay = self.default_image_index  # resets delay for next ducking action
-            elif index == self.final_duck_image_index and self.duck_delay < self.ducking_period:  # create delay for ducking to dodge attacks
-                self.duck_delay += 1
-            elif self.first_attack_image_index <= index < self.final_attack_image_index:  # animate attacking action
-                self.current_image_index = index + 1
-            elif index == self.final_attack_image_index:  # attack animation ended
-                self.current_image_index = self.default_image_index
-                self.event = False  # cancels the action so attack or duck can occur again
-                self.attack = False
-
-            # determines which direction of movement to animate
-            if self.previous_direction == "left":
-                self.current_image = self.image_list_left[self.current_image_index]
-                self.canvas.itemconfig(self.sprite_object_image, image=self.current_image)
-            elif self.previous_direction == "right":
-                self.current_image = self.image_list_right[self.current_image_index]
-                self.canvas.itemconfig(self.sprite_object_image, image=self.current_image)
-            self.image_iteration_period = 0
-        self.image_iteration_period += 1
+    def next_frame(self):  # called by the frame timer, animates sprite by changing the current image of the sprite
+        if self.visibility is False or self.animating is False:
+            return
+        next_index, frame_end = self.animation.transitions[self.current_image_index]  # walking and action frames step forward
+        if frame_end == FRAME_NEXT:
+            self.current_image_index = next_index
+        elif frame_end == FRAME_END_DUCK and self.duck_delay == self.ducking_period:  # end ducking action if delay has passed
+            self.current_image_index = next_index  # resets animation to walking
+            self.event = False  # cancels the action so attack or duck can occur again
+            self.duck = False
+            self.duck_delay = 0  # resets delay for next ducking action
+        elif frame_end == FRAME_END_DUCK and self.duck_delay < self.ducking_period:  # create delay for ducking to dodge attacks
+            self.duck_delay += 1
+        elif frame_end == FRAME_END_ATTACK:  # attack animation ended
+            self.current_image_index = next_index
+            self.event = False  # cancels the action so attack or duck can occur again
+            self.attack = False
+
+        # determines which direction of movement to animate
+        if self.previous_direction == "left":
+            self.current_image = self.image_list_left[self.current_image_index]
+        elif self.previous_direction == "right":
+            self.current_image = self.image_list_right[self.current_image_index]
+
+    def save_state(self):  # packs the simulation state of the sprite into bytes, see load_state
+        # enemies can stack the same velocity more than once, the whole stack is kept as it changes how they move
+        velocity_signs = 0
+        for i, velocity in enumerate(self.velocity[1:]):
+            if velocity > 0:
+                velocity_signs |= 1 << i
+        velocity_count = len(self.velocity) - 1
+        frame_timer = self.frame_timer
+        state = SPRITE_STATE.pack(
+            self.sprite_type, self.x, self.y, velocity_count, velocity_signs & 0xFFFFFFFFFFFFFFFF,
+            self.previous_direction == "left", self.event, ACTION_STATES.index(self.attack),
+            ACTION_STATES.index(self.duck), self.duck_delay, self.current_image_index, self.health, self.visibility,
+            frame_timer.due - frame_timer.wheel.tick if frame_timer is not None else -1)
+        if velocity_count > 64:
+            state += (velocity_signs >> 64).to_bytes((velocity_count - 57) // 8, "little")
+        return state
+
+    def load_state(self, state, offset, timers):  # restores bytes from save_state, returns the offset after them
+        (self.sprite_type, self.x, self.y, velocity_count, velocity_signs, facing_left, self.event, attack, duck,
+         self.duck_delay, self.current_image_index, health, self.visibility, frame_delay) = \
+            SPRITE_STATE.unpack_from(state, offset)
+        offset += SPRITE_STATE.size
+        if velocity_count > 64:
+            extra_bytes = (velocity_count - 57) // 8
+            velocity_signs |= int.from_bytes(state[offset:offset + extra_bytes], "little") << 64
+            offset += extra_bytes
+        x_velocity = self.x_velocity_constant
+        self.velocity = [0] + [x_velocity if velocity_signs >> i & 1 else -x_velocity for i in range(velocity_count)]
+        self.previous_direction = "left" if facing_left else "right"
+        self.attack = ACTION_STATES[attack]
+        self.duck = ACTION_STATES[duck]
+        self.health = (0, health)
+        images = self.image_list_left if facing_left else self.image_list_right
+        self.current_image = images[self.current_image_index] if self.visibility and images else None
+        self.stop_animation()
+        if frame_delay >= 0:
+            self.frame_timer = timers.schedule(frame_delay, self.next_frame, self.animation_speed)
+        return offset
 
 
 class Player(Sprite):  # contains player specific attributes and methods for a sprite, inherits from Sprite()
-    def __init__(self, canvas, canvas_width, canvas_height, default_health):
-        self.canvas = canvas
+    __slots__ = ("default_health",)
+    x_velocity_constant = 2.5
+
+    def __init__(self, canvas_width, canvas_height, default_health):
         self.canvas_width = canvas_width
         self.canvas_height = canvas_height
-        self.x_velocity_constant = 2.5
         self.default_health = default_health
         Sprite.__init__(self, 1)  # '1' will always be player sprite type
 
     def on_keypress(self, event):
-        print("press", event.keysym, "x velocity", self.velocity)
         if event.keysym == "d" and self.x_velocity_constant not in self.velocity:
             self.velocity.append(self.x_velocity_constant)
         elif event.keysym == "a" and -self.x_velocity_constant not in self.velocity:
             self.velocity.append(-self.x_velocity_constant)
 
     def on_keyrelease(self, event):
-        print("release", event.keysym, "x velocity", self.velocity)
         if event.keysym == "a" and -self.x_velocity_constant in self.velocity:
             self.velocity.remove(-self.x_velocity_constant)
         elif event.keysym == "d" and self.x_velocity_constant in self.velocity:
             self.velocity.remove(self.x_velocity_constant)
-        print("finish release", event.keysym, "x velocity", self.velocity)
 
 
 class Enemy(Sprite):  # contains enemy specific attributes and methods for a sprite, inherits from Sprite()
-    def __init__(self, canvas, canvas_width, canvas_height, sprite_type):
-        self.canvas = canvas
+    __slots__ = ()
+    x_velocity_constant = 1.5
+
+    def __init__(self, canvas_width, canvas_height, sprite_type):
         self.canvas_width = canvas_width
         self.canvas_height = canvas_height
-        self.x_velocity_constant = 1.5
         Sprite.__init__(self, sprite_type)
         self.sprite_properties()
 
@@ -379,11 +1265,28 @@ class Enemy(Sprite):  # contains enemy specific attributes and methods for a spr
         self.health = (0, self.sprite_type * 25)
         self.attack_damage = self.sprite_type
 
+    def respawn(self, sprite_type):  # resets a pooled enemy to the state of a new enemy of the given type
+        self.sprite_type = sprite_type
+        self.sprite_properties()
+        del self.velocity[1:]
+        self.previous_direction = "right"
+        self.event = False
+        self.attack = None
+        self.duck = None
+        self.duck_delay = 0
+        self.current_image = None
+        self.current_image_index = self.default_image_index
+        self.x = 0
+        self.y = self.canvas_height
+        self.visibility = False
+
+    def load_state(self, state, offset, timers):
+        self.sprite_type = state[offset]  # the sprite type is the first field
+        self.sprite_properties()  # the attack damage comes from the sprite type, the health is restored after
+        return Sprite.load_state(self, state, offset, timers)
+
     def calculate_movement(self, player):  # calculates which direction to move in next towards player
-        enemy = self.sprite_object_image
-        player_coordinates = self.canvas.coords(player.sprite_object_image)
-        enemy_coordinates = self.canvas.coords(enemy)
-        distance = enemy_coordinates[0] - player_coordinates[0]  # difference between coordinates
+        distance = self.x - player.x  # difference between coordinates
         distance_with_velocity = distance + self.velocity[-1]   # difference between coordinates with enemy velocity to see if enemy gets closer or further away from player with next movement
         if abs(distance_with_velocity) > abs(distance):
             return True
@@ -391,7 +1294,6 @@ class Enemy(Sprite):  # contains enemy specific attributes and methods for a spr
             return False
 
     def change_movement(self, swap_movement):  # if the enemy has moved away the movement will be swapped to move them closer
-        enemy = self.sprite_object_image
         if self.velocity[-1] == self.x_velocity_constant and swap_movement is True:
             self.velocity.remove(self.x_velocity_constant)
             self.velocity.append(-self.x_velocity_constant)
@@ -405,6 +1307,370 @@ class Enemy(Sprite):  # contains enemy specific attributes and methods for a spr
                 self.velocity.append(-self.x_velocity_constant)
 
 
+def _batch_field(name, convert):  # property that stores a sprite attribute in a slot of an EnemyBatch array
+    def get_field(self):
+        return convert(getattr(self.batch, name)[self.slot])
+
+    def set_field(self, value):
+        getattr(self.batch, name)[self.slot] = value
+    return property(get_field, set_field)
+
+
+def _direction_name(direction):
+    return "right" if direction > 0 else "left"
+
+
+class BatchEnemy(Enemy):  # enemy whose state is a slot in the arrays of an EnemyBatch, behaves the same as Enemy
+    __slots__ = ("batch", "slot")
+    x = _batch_field("x", float)
+    var_health = _batch_field("health", int)
+    var_attack_damage = _batch_field("attack_damage", int)
+    attack = _batch_field("attack", bool)
+    duck = _batch_field("duck", bool)
+    event = _batch_field("event", bool)
+    duck_delay = _batch_field("duck_delay", int)
+    current_image_index = _batch_field("image_index", int)
+    visibility = _batch_field("visibility", bool)
+
+    def __init__(self, batch, slot, canvas_width, canvas_height, sprite_type):
+        self.batch = batch
+        self.slot = slot
+        self.batch.sprite_type[slot] = sprite_type
+        Enemy.__init__(self, canvas_width, canvas_height, sprite_type)
+
+    @property
+    def velocity(self):  # enemies only ever move at one velocity so the stack is rebuilt from it
+        x_velocity = float(self.batch.velocity[self.slot])
+        return [0, x_velocity] if x_velocity != 0 else [0]
+
+    @velocity.setter
+    def velocity(self, velocity):
+        self.batch.velocity[self.slot] = velocity[-1]
+
+    @property
+    def previous_direction(self):
+        return _direction_name(self.batch.direction[self.slot])
+
+    @previous_direction.setter
+    def previous_direction(self, previous_direction):
+        self.batch.direction[self.slot] = 1 if previous_direction == "right" else -1
+
+    @property
+    def current_image(self):  # the image is looked up from the index and the direction it was animated in
+        if self.batch.image_direction[self.slot] > 0:
+            return self.image_list_right[self.current_image_index]
+        return self.image_list_left[self.current_image_index]
+
+    @current_image.setter
+    def current_image(self, image):  # display_sprite and EnemyBatch.animate set the direction of the image instead
+        pass
+
+    def display_sprite(self, direction, image_index, x_coordinates):
+        Enemy.display_sprite(self, direction, image_index, x_coordinates)
+        self.batch.image_direction[self.slot] = 1 if direction == "right" else -1
+
+    def start_animation(self, timers):  # enemies whose frames change on the same ticks share one frame timer
+        self.frame_timer = self.batch.frame_timer(self.slot, timers)
+
+    def stop_animation(self):  # the shared frame timer keeps running for the other enemies
+        self.frame_timer = None
+
+    def change_movement(self, swap_movement):  # same as Enemy.change_movement for a single velocity
+        x_velocity = self.velocity[-1]
+        if x_velocity != 0 and swap_movement is True:
+            self.velocity = [0, -x_velocity]
+        elif self.previous_direction == "right":
+            self.velocity = [0, self.x_velocity_constant]
+        else:
+            self.velocity = [0, -self.x_velocity_constant]
+
+
+class EnemyBatch:  # stores the state of every enemy as numpy arrays so each tick updates them all at once
+    def __init__(self, game, capacity=64):
+        if numpy is None:
+            raise ImportError("numpy is required to batch enemies")
+        self.game = game
+        self.capacity = 0
+        self.enemies = []  # BatchEnemy for each slot, None when the slot is free
+        self.free_slots = []
+        self.template = Enemy(game.canvas_width, game.canvas_height, 2)  # constants shared by every enemy
+        self.next_frame_index = numpy.array([transition[0] for transition in Enemy.animation.transitions])
+        self.frame_end = numpy.array([transition[1] for transition in Enemy.animation.transitions])
+        self.phase_timers = {}  # frame timer for each tick of the animation period that frames can change on
+        self.due_phases = []  # phases whose frame timer has fired this tick
+        self.x = numpy.zeros(0)
+        self.velocity = numpy.zeros(0)
+        self.health = numpy.zeros(0, dtype=numpy.int64)
+        self.attack_damage = numpy.zeros(0, dtype=numpy.int64)
+        self.sprite_type = numpy.zeros(0, dtype=numpy.int64)
+        self.attack = numpy.zeros(0, dtype=bool)
+        self.duck = numpy.zeros(0, dtype=bool)
+        self.event = numpy.zeros(0, dtype=bool)
+        self.duck_delay = numpy.zeros(0, dtype=numpy.int64)
+        self.direction = numpy.zeros(0, dtype=numpy.int8)  # 1 for right and -1 for left
+        self.image_direction = numpy.zeros(0, dtype=numpy.int8)  # direction of the image list for the current image
+        self.image_index = numpy.zeros(0, dtype=numpy.int64)
+        self.frame_phase = numpy.zeros(0, dtype=numpy.int64)  # tick of the animation period the frame changes on
+        self.visibility = numpy.zeros(0, dtype=bool)
+        self.active = numpy.zeros(0, dtype=bool)  # False for free slots
+        self._grow(capacity)
+
+    def _grow(self, capacity):  # enlarges every array, new slots are free
+        for name in ("x", "velocity", "health", "attack_damage", "sprite_type", "attack", "duck", "event",
+                     "duck_delay", "direction", "image_direction", "image_index", "frame_phase", "visibility",
+                     "active"):
+            array = getattr(self, name)
+            grown = numpy.zeros(capacity, dtype=array.dtype)
+            grown[:self.capacity] = array
+            setattr(self, name, grown)
+        self.enemies.extend([None] * (capacity - self.capacity))
+        self.free_slots.extend(range(capacity - 1, self.capacity - 1, -1))  # lowest slots are used first
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.capacity - len(self.free_slots)
+
+    def add(self, sprite_type):  # creates an enemy in a free slot
+        if not self.free_slots:
+            self._grow(self.capacity * 2)
+        slot = self.free_slots.pop()
+        self.active[slot] = True
+        enemy = BatchEnemy(self, slot, self.game.canvas_width, self.game.canvas_height, sprite_type)
+        self.enemies[slot] = enemy
+        return enemy
+
+    def frame_timer(self, slot, timers):  # returns the frame timer for an enemy starting its animation this tick
+        animation_speed = self.template.animation_speed
+        phase = timers.tick % animation_speed
+        self.frame_phase[slot] = phase
+        timer = self.phase_timers.get(phase)
+        if timer is None:
+            timer = timers.schedule(0, lambda: self.due_phases.append(phase), animation_speed)
+            self.phase_timers[phase] = timer
+        return timer
+
+    def remove(self, enemy):  # frees the slot of an enemy
+        enemy.stop_animation()
+        self.active[enemy.slot] = False
+        self.visibility[enemy.slot] = False
+        self.enemies[enemy.slot] = None
+        self.free_slots.append(enemy.slot)
+
+    def update(self, player, difficulty):  # runs one game tick for the player and every enemy
+        game = self.game
+        profiler = game.profiler
+        enemy = self.template
+        if player.visibility is False:
+            game.display_sprites(0)
+        for slot in numpy.flatnonzero(self.active & ~self.visibility):  # spawns new enemies
+            game.spawn_sprite(self.enemies[slot], True)  # the slot holds the enemy so the list is not searched
+        player.move()
+        if profiler is not None:
+            profiler.lap("movement")
+
+        live = self.active
+        # calculate_movement and change_movement, enemies moving away from the player turn around
+        distance = self.x - player.x
+        moving_away = numpy.abs(distance + self.velocity) > numpy.abs(distance)
+        chase_velocity = numpy.where(self.direction > 0, enemy.x_velocity_constant, -enemy.x_velocity_constant)
+        self.velocity = numpy.where(live, numpy.where(moving_away, -self.velocity, chase_velocity), self.velocity)
+        if profiler is not None:
+            profiler.lap("enemy_ai")
+
+        # move, enemies only move when their next position is within the canvas
+        next_x = self.x + self.velocity
+        within_bounds = live & (next_x >= 0) & (next_x <= game.canvas_width - enemy.image_width)
+        acting = self.attack | self.duck
+        moving_right = within_bounds & ~acting & (self.velocity == enemy.x_velocity_constant)
+        moving_left = within_bounds & ~acting & (self.velocity == -enemy.x_velocity_constant)
+        moving = moving_right | moving_left
+        self.x[moving] = next_x[moving]
+        self.direction[moving_right] = 1
+        self.direction[moving_left] = -1
+        if profiler is not None:
+            profiler.lap("movement")
+
+        # sprite_interaction for enemies overlapping the player
+        player_x1, player_y1, player_x2, player_y2 = player.bbox
+        if player_y1 <= game.canvas_height and player_y2 >= game.canvas_height - enemy.image_height:
+            overlapping = live & self.visibility & (self.x <= player_x2) & (self.x + enemy.collision_width >= player_x1)
+            overlapping_slots = numpy.flatnonzero(overlapping)
+            if profiler is not None:
+                profiler.lap("collision")
+            for slot in overlapping_slots:
+                game.sprite_interaction(player, self.enemies[slot], True)
+            if profiler is not None:
+                profiler.lap("interaction")
+
+        # update_score and remove_sprite for defeated enemies, each one is replaced by a new enemy
+        dead = live & (self.health <= 0)
+        if dead.any():
+            game.score += int(self.sprite_type[dead].sum()) * 25  # same method for calculating enemy health
+            dead_enemies = set()
+            for slot in numpy.flatnonzero(dead):
+                dead_enemies.add(self.enemies[slot])
+                self.remove(self.enemies[slot])
+            game.sprite_list = [sprite for sprite in game.sprite_list if sprite not in dead_enemies]
+            for i in range(len(dead_enemies)):
+                game.replace_enemy(difficulty)
+        if profiler is not None:
+            profiler.lap("score_removal")
+
+    def animate(self):  # steps the animation of the enemies whose frame timer fired in the same way as Sprite.next_frame
+        if not self.due_phases:
+            return
+        enemy = self.template
+        slots = numpy.flatnonzero(self.active & numpy.isin(self.frame_phase, self.due_phases))
+        self.due_phases = []
+        velocity = self.velocity[slots]
+        next_x = self.x[slots] + velocity
+        acting = self.attack[slots] | self.duck[slots]
+        animating = self.visibility[slots] & (next_x >= 0) & (next_x <= self.game.canvas_width - enemy.image_width) \
+            & (acting | (numpy.abs(velocity) == enemy.x_velocity_constant))  # same as Sprite.animating
+        slots = slots[animating]
+        index = self.image_index[slots]
+        frame_end = self.frame_end[index]  # the same transition table as Sprite.next_frame
+        at_final_duck = frame_end == FRAME_END_DUCK
+        duck_ended = at_final_duck & (self.duck_delay[slots] == enemy.ducking_period)
+        duck_delayed = at_final_duck & (self.duck_delay[slots] < enemy.ducking_period)
+        attack_ended = frame_end == FRAME_END_ATTACK
+
+        changing = (frame_end == FRAME_NEXT) | duck_ended | attack_ended
+        self.image_index[slots[changing]] = self.next_frame_index[index[changing]]
+        self.event[slots[duck_ended | attack_ended]] = False  # cancels the action so attack or duck can occur again
+        self.duck[slots[duck_ended]] = False
+        self.duck_delay[slots[duck_ended]] = 0
+        self.duck_delay[slots[duck_delayed]] += 1
+        self.attack[slots[attack_ended]] = False
+        self.image_direction[slots] = self.direction[slots]
+
+
+KeyEvent = collections.namedtuple("KeyEvent", ["keysym"])  # stands in for a tkinter event when keys are not pressed
+
+
+class PlayerController:  # presses the keys for an action so the player can be controlled without a keyboard
+    actions = ("left", "right", "attack", "duck", "idle")
+
+    def __init__(self):
+        self.held_key = None
+
+    def perform(self, player, action):  # releases the key held for the last action then starts the next action
+        if self.held_key is not None:
+            player.on_keyrelease(KeyEvent(self.held_key))
+            self.held_key = None
+        if action == "left" or action == "right":
+            self.held_key = "a" if action == "left" else "d"
+            player.on_keypress(KeyEvent(self.held_key))
+        elif action == "attack":
+            player.attack_action(KeyEvent("space"))
+        elif action == "duck":
+            player.duck_action(KeyEvent("s"))
+
+
+class ScriptedPlayer(PlayerController):  # presses keys in a seeded random pattern to play without a keyboard
+    def __init__(self, seed=None, action_length=40):
+        PlayerController.__init__(self)
+        self.random = random.Random(seed)
+        self.action_length = action_length  # ticks each action lasts for
+
+    def press_keys(self, player, tick):  # chooses a new action every action_length ticks
+        if tick % self.action_length != 0 or player.visibility is False:  # keys do nothing until the player spawns
+            return
+        self.perform(player, self.random.choice(self.actions))
+
+
+INPUT_LOG_MAGIC = b"PFIL"
+INPUT_LOG_VERSION = 5  # logs from older versions do not replay the same game
+INPUT_LOG_HEADER = struct.Struct("<4sBQH?I?")
+# magic, version, seed, enemy count (0 for the difficulty), enemy batch, AI updates per tick (0 when every enemy runs),
+# horde mode
+INPUT_LOG_RECORD = struct.Struct("<IBB")  # tick the input happened after, input type, key or difficulty
+INPUT_PRESS, INPUT_RELEASE, INPUT_ATTACK, INPUT_DUCK, INPUT_START, INPUT_END = range(6)
+SNAPSHOT_MAGIC = b"PFSS"
+SNAPSHOT_VERSION = 2  # snapshots from other versions cannot be loaded
+SNAPSHOT_HEADER = struct.Struct("<4sBBI?")  # magic, version, difficulty, ticks played, horde mode, then the game state
+
+
+class InputQueue:  # holds key events from tkinter until the start of the next tick, where their edges are worked out
+    press_inputs = {"a": INPUT_PRESS, "d": INPUT_PRESS, "space": INPUT_ATTACK, "s": INPUT_DUCK}
+
+    def __init__(self, max_latency_samples=1000):
+        self.events = collections.deque()  # appending and popping from a deque is atomic so no lock is needed
+        self.held_keys = set()  # keys held down as of the last tick
+        self.applied_times = []  # times of the key events applied since the last frame was drawn
+        self.latencies = collections.deque(maxlen=max_latency_samples)  # seconds from key event to the frame showing it
+        self.repeats_ignored = 0  # presses of movement keys already held down, tkinter repeats held keys
+
+    def push(self, keysym, pressed):  # called by tkinter with every key event, the player is not changed here
+        self.events.append((time.perf_counter(), keysym, pressed))
+
+    def clear(self):
+        self.events.clear()
+        self.held_keys.clear()
+        self.applied_times = []
+
+    def drain(self, apply_input):  # calls apply_input(input type, keysym) for each press and release edge in order
+        releases = []  # releases wait until every event has been seen as a repeated key sends a release then a press
+        while self.events:
+            event_time, keysym, pressed = self.events.popleft()
+            if pressed is False:
+                if keysym in self.held_keys and keysym not in (release[0] for release in releases):
+                    releases.append((keysym, event_time))
+            elif keysym in self.held_keys:  # a repeat of a held key, cancelling its release if there was one
+                releases = [release for release in releases if release[0] != keysym]
+                if self.press_inputs[keysym] == INPUT_PRESS:  # a movement key stays pressed
+                    self.repeats_ignored += 1
+                else:  # holding space or s keeps attacking or ducking as each repeat starts the action again
+                    apply_input(self.press_inputs[keysym], keysym)
+                    self.applied_times.append(event_time)
+            else:
+                self.held_keys.add(keysym)
+                apply_input(self.press_inputs[keysym], keysym)
+                self.applied_times.append(event_time)
+        for keysym, event_time in releases:
+            self.held_keys.discard(keysym)
+            if self.press_inputs[keysym] == INPUT_PRESS:  # only movement keys do anything when released
+                apply_input(INPUT_RELEASE, keysym)
+                self.applied_times.append(event_time)
+
+    def frame_drawn(self, frame_time):  # the actions applied since the last frame are shown by this frame
+        for event_time in self.applied_times:
+            self.latencies.append(frame_time - event_time)
+        self.applied_times = []
+
+    def latency_percentiles(self):  # p50 and p95 of the latency in seconds, None before any input
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[len(latencies) // 2], latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+
+
+class InputRecorder:  # writes the seed and every input of a session to a binary log so the session can be replayed
+    def __init__(self, path, seed, enemy_count, enemy_batch, ai_update_budget, horde):
+        self.records = 0
+        self.log_file = open(path, "wb")
+        self.log_file.write(INPUT_LOG_HEADER.pack(INPUT_LOG_MAGIC, INPUT_LOG_VERSION, seed, enemy_count or 0,
+                                                  enemy_batch, ai_update_budget or 0, horde))
+
+    def record(self, tick, input_type, value=0):
+        self.log_file.write(INPUT_LOG_RECORD.pack(tick, input_type, value))
+        self.records += 1
+
+    def close(self, tick):  # marks where the session ended so a replay stops on the same tick
+        self.record(tick, INPUT_END)
+        self.log_file.close()
+
+
+def read_input_log(path):  # returns the seed, enemy count, enemy batch, AI update budget, horde and records of a log
+    with open(path, "rb") as log_file:
+        data = log_file.read()
+    if data[:len(INPUT_LOG_MAGIC)] != INPUT_LOG_MAGIC or data[len(INPUT_LOG_MAGIC)] != INPUT_LOG_VERSION:
+        raise ValueError("{} is not a version {} input log".format(path, INPUT_LOG_VERSION))
+    magic, version, seed, enemy_count, enemy_batch, ai_update_budget, horde = INPUT_LOG_HEADER.unpack_from(data)
+    records = list(INPUT_LOG_RECORD.iter_unpack(data[INPUT_LOG_HEADER.size:]))
+    return seed, enemy_count or None, enemy_batch, ai_update_budget or None, horde, records
+
+
 class Scoreboard:  # contains methods and attributes of the scoreboard to be displayed at end game
     def __init__(self, canvas, canvas_height, canvas_width):
         self.canvas = canvas
@@ -434,141 +1700,762 @@ class Scoreboard:  # contains methods and attributes of the scoreboard to be dis
         self.restart = True
 
 
+RENDER_SCALES = (0.5, 0.75, 1, 1.25, 1.5, 2)  # scales F7 and F8 step through
+
+
+class ScaledFrameCache:  # scaled copies of the game's frames, built once for each render scale and shared by sprites
+    def __init__(self, max_scales=2):
+        if max_scales < 1:  # the variant of the current scale always has to be kept
+            raise ValueError("at least one scaled variant has to be kept")
+        self.max_scales = max_scales  # render scales kept resident, the least recently used is evicted past this
+        self.variants = collections.OrderedDict()  # render scale: {original frame: scaled frame}, least recent first
+        self.scale = fractions.Fraction(1)
+        self.frames = None  # variant of the current scale, None at a scale of 1 where the original frames are used
+        self.frames_scaled = 0
+        self.variants_built = 0
+        self.evictions = 0
+
+    @staticmethod
+    def scale_fraction(scale):  # PhotoImage only zooms and subsamples by whole numbers so scales are fractions
+        return fractions.Fraction(scale).limit_denominator(8)
+
+    def set_scale(self, scale, frame_sets=()):  # switches scale and scales every frame of the frame sets not yet scaled
+        self.scale = self.scale_fraction(scale)
+        if self.scale == 1:
+            self.frames = None
+            return
+        frames = self.variants.get(self.scale)
+        if frames is None:
+            frames = self.variants[self.scale] = {}
+            self.variants_built += 1
+            while len(self.variants) > self.max_scales:  # the current scale was added last so it is never evicted
+                self.variants.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.variants.move_to_end(self.scale)
+        self.frames = frames
+        for frame_set in frame_sets:
+            self.scale_frames(frame_set)
+
+    def scale_frames(self, frames):  # scales a set of frames ahead of time so they are not scaled mid game
+        for frame in frames:
+            self.get(frame)
+
+    def get(self, frame):  # the frame at the current scale, scaled the first time it is used at that scale
+        if self.frames is None or frame == "":
+            return frame
+        scaled_frame = self.frames.get(frame)
+        if scaled_frame is None:
+            scaled_frame = frame
+            if self.scale.numerator > 1:
+                scaled_frame = scaled_frame.zoom(self.scale.numerator)
+            if self.scale.denominator > 1:
+                scaled_frame = scaled_frame.subsample(self.scale.denominator)
+            self.frames[frame] = scaled_frame
+            self.frames_scaled += 1
+        return scaled_frame
+
+    @property
+    def resident_frames(self):
+        return sum(len(frames) for frames in self.variants.values())
+
+    @property
+    def resident_bytes(self):  # tk photo images hold 4 bytes for each pixel
+        return sum(frame.width() * frame.height() * 4 for frames in self.variants.values() for frame in frames.values())
+
+
+class GameView:  # retained render layer, mirrors the game onto a canvas by only sending what changed once per frame
+    def __init__(self, canvas, game, render_scale=1, scaled_frames=None):
+        self.canvas = canvas
+        self.game = game
+        self.scaled_frames = scaled_frames if scaled_frames is not None else ScaledFrameCache()
+        self.scaled_frames.set_scale(render_scale)
+        self.scale = float(self.scaled_frames.scale)  # canvas pixels for each pixel of the game
+        self.background_image = self.canvas.create_image(0, 0, image="", anchor=NW)
+        self.displayed_background_image = ""
+        self.sprite_images = {}  # maps each displayed sprite to the canvas image that represents it
+        self.displayed_sprites = {}  # maps each canvas image of a sprite to the x, y and image last sent to the canvas
+        self.hidden_images = []  # canvas images of removed sprites, hidden until they are given to a new sprite
+        self.image_pool_size = game.enemy_pool.size
+        self.images_created = 0
+        self.images_reused = 0
+        self.health_bar_rectangle_red = None  # will be reassigned a red rectangle object
+        self.health_bar_rectangle_green = None  # will be reassigned a green rectangle object to indicate health
+        self.displayed_health_bar_width = None
+        self.pending_commands = []  # canvas commands for this frame, sent together as one tcl script
+        self.frames = 0
+        self.frame_ops = 0  # canvas operations sent for the last frame
+        self.total_ops = 0
+        self.unbatched_ops = 0  # operations drawing every item every frame would have sent
+
+    def _queue(self, *command):  # queues a canvas command such as ("coords", item, x, y) to be sent with the frame
+        self.pending_commands.append(command)
+
+    def flush(self):  # sends the queued commands to the canvas in a single call
+        self.frame_ops += len(self.pending_commands)
+        if not self.pending_commands:
+            return
+        canvas_path = str(self.canvas)
+        script = "\n".join(" ".join([canvas_path] + [str(word) if word != "" else "{}" for word in command])
+                           for command in self.pending_commands)
+        self.canvas.tk.eval(script)
+        self.pending_commands = []
+
+    def set_scale(self, render_scale):  # changes the size everything is drawn at, frames already scaled are reused
+        game = self.game
+        self.scaled_frames.set_scale(render_scale, (game.background_image_list, game.player_image_list_right,
+                                                    game.player_image_list_left, game.enemy_image_list_right,
+                                                    game.enemy_image_list_left))
+        self.scale = float(self.scaled_frames.scale)
+        self.canvas.config(width=round(game.canvas_width * self.scale), height=round(game.canvas_height * self.scale))
+        self.displayed_background_image = None  # everything is sent again at the new scale on the next draw
+        for displayed in self.displayed_sprites.values():
+            displayed[:] = [None, None, None]
+        if self.health_bar_rectangle_red is not None:  # recreated at the new scale
+            self.canvas.delete(self.health_bar_rectangle_red, self.health_bar_rectangle_green)
+            self.health_bar_rectangle_red = None
+            self.health_bar_rectangle_green = None
+
+    def reset(self):  # deletes the canvas items of the game so the next draw builds them again, used after a restore
+        items = list(self.displayed_sprites) + self.hidden_images
+        if self.health_bar_rectangle_red is not None:
+            items += [self.health_bar_rectangle_red, self.health_bar_rectangle_green]
+        if items:
+            self.canvas.delete(*items)
+        self.sprite_images = {}
+        self.displayed_sprites = {}
+        self.hidden_images = []
+        self.health_bar_rectangle_red = None
+        self.health_bar_rectangle_green = None
+        self.displayed_health_bar_width = None
+        self.displayed_background_image = None
+        self.pending_commands = []
+
+    def acquire_image(self, sprite):  # shows a hidden canvas image for a newly spawned sprite, or creates one
+        scale = self.scale
+        if self.hidden_images:
+            sprite_image = self.hidden_images.pop()
+            self._queue("coords", sprite_image, sprite.x * scale, sprite.y * scale)
+            self._queue("itemconfigure", sprite_image, "-image", self.scaled_frames.get(sprite.current_image),
+                        "-state", "normal")
+            self.images_reused += 1
+        else:
+            sprite_image = self.canvas.create_image(sprite.x * scale, sprite.y * scale,
+                                                    image=self.scaled_frames.get(sprite.current_image), anchor=SW)
+            self.frame_ops += 1
+            self.images_created += 1
+        self.displayed_sprites[sprite_image] = [sprite.x, sprite.y, sprite.current_image]
+        return sprite_image
+
+    def release_images(self, sprite_images):  # hides canvas images for reuse, those that do not fit are deleted
+        deleted_images = []
+        for sprite_image in sprite_images:
+            del self.displayed_sprites[sprite_image]
+            if len(self.hidden_images) < self.image_pool_size:
+                self._queue("itemconfigure", sprite_image, "-state", "hidden")
+                self.hidden_images.append(sprite_image)
+            else:
+                deleted_images.append(sprite_image)
+        if deleted_images:
+            self.canvas.delete(*deleted_images)
+            self.frame_ops += 1
+
+    def draw(self):  # updates the canvas items to match the current game state
+        game = self.game
+        scale = self.scale
+        scaled_frames = self.scaled_frames
+        self.frame_ops = 0
+        if game.current_background_image is not self.displayed_background_image:  # only redrawn when it changes
+            self._queue("itemconfigure", self.background_image, "-image",
+                        scaled_frames.get(game.current_background_image))
+            self.displayed_background_image = game.current_background_image
+
+        if game.health_bar_visible is True and self.health_bar_rectangle_red is None:
+            health_bar_coords = [coord * scale for coord in game.health_bar_coords]
+            self.health_bar_rectangle_red = self.canvas.create_rectangle(*health_bar_coords, fill="red")
+            self.health_bar_rectangle_green = self.canvas.create_rectangle(*health_bar_coords, fill="green")
+            self.displayed_health_bar_width = game.health_bar_coords[2]
+            self.frame_ops += 2
+        elif game.health_bar_visible is False and self.health_bar_rectangle_red is not None:
+            self.canvas.delete(self.health_bar_rectangle_red, self.health_bar_rectangle_green)  # remove health bars
+            self.health_bar_rectangle_red = None
+            self.health_bar_rectangle_green = None
+            self.frame_ops += 1
+        if self.health_bar_rectangle_green is not None and game.health_bar_width != self.displayed_health_bar_width:
+            x1, y1, x2, y2 = game.health_bar_coords
+            self._queue("coords", self.health_bar_rectangle_green, x1 * scale, y1 * scale,
+                        game.health_bar_width * scale, y2 * scale)
+            self.displayed_health_bar_width = game.health_bar_width
+
+        displayed_sprites = self.displayed_sprites
+        visible_sprites = 0
+        for sprite in game.sprite_list:
+            if sprite.visibility is False:  # sprite has not been spawned yet
+                continue
+            visible_sprites += 1
+            sprite_image = self.sprite_images.get(sprite)
+            if sprite_image is None:
+                self.sprite_images[sprite] = self.acquire_image(sprite)
+                continue
+            displayed = displayed_sprites[sprite_image]
+            if sprite.x != displayed[0] or sprite.y != displayed[1]:
+                self._queue("coords", sprite_image, sprite.x * scale, sprite.y * scale)
+                displayed[0] = sprite.x
+                displayed[1] = sprite.y
+            if sprite.current_image is not displayed[2]:  # the displayed frame is compared before it is scaled
+                self._queue("itemconfigure", sprite_image, "-image", scaled_frames.get(sprite.current_image))
+                displayed[2] = sprite.current_image
+
+        if len(self.sprite_images) > visible_sprites:  # some canvas images belong to sprites removed from the game
+            active_sprites = set(game.sprite_list)
+            # pooled enemies can be back in the game but not yet respawned, their old image is removed as well
+            removed_images = [self.sprite_images.pop(sprite) for sprite in list(self.sprite_images)
+                              if sprite not in active_sprites or sprite.visibility is False]
+            if removed_images:
+                self.release_images(removed_images)
+        self.flush()
+
+        self.frames += 1
+        self.total_ops += self.frame_ops
+        self.unbatched_ops += 2 + 2 * len(self.sprite_images)  # background, health bar and each sprite's image and coords
+
+
+class ProfilerOverlay:  # displays the percentiles of the tick profiler in the top right corner of the canvas
+    refresh_period = 0.5  # seconds between updates of the text
+
+    def __init__(self, canvas, profiler, canvas_width):
+        self.canvas = canvas
+        self.profiler = profiler
+        self.canvas_width = canvas_width
+        self.visible = True
+        self.text = None  # canvas text item, created when first displayed
+        self._refresh_time = 0.0
+
+    def toggle(self, event):  # called with keypress of F3
+        self.visible = not self.visible
+        if self.visible is False and self.text is not None:
+            self.canvas.delete(self.text)
+            self.text = None
+        self._refresh_time = 0.0
+
+    def update(self):
+        now = time.perf_counter()
+        if self.visible is False or now - self._refresh_time < self.refresh_period:
+            return
+        self._refresh_time = now
+        lines = ["{:<14}{:>7}{:>7}{:>7}".format("PHASE (ms)", "p50", "p95", "p99")]
+        for phase, percentiles in self.profiler.summary().items():
+            lines.append("{:<14}{p50:>7.3f}{p95:>7.3f}{p99:>7.3f}".format(phase, **percentiles))
+        if self.text is None:
+            self.text = self.canvas.create_text(self.canvas_width - 10, 10, anchor=NE, fill="white",
+                                                font=("Courier", 9), text="\n".join(lines))
+        else:
+            self.canvas.itemconfig(self.text, text="\n".join(lines))
+        self.canvas.tag_raise(self.text)  # sprites created since the last update are drawn above it
+
+
 class Main:
-    def __init__(self, tk_window):
-        self.window = tk_window
-        self.window.title("BEAT 'EM UP")
+    def __init__(self, tk_window=None, enemy_batch=False, staged_loading=True, background_mode="animated",
+                 profile=False, profile_output=None, seed=None, enemy_count=None, record_path=None,
+                 enemy_pool_size=16, ai_lod=False, ai_update_budget=AI_UPDATE_BUDGET, horde=False,
+                 render_scale=1, scale_variants=2, key_log=None, checkpoint_path=None, checkpoint_interval=5,
+                 resume_path=None, quiet=False):
+        self.window = tk_window  # when there is no window the game runs headless and nothing is drawn
+        self.resume_snapshot = None  # loaded in place of the title screen once the assets have loaded
+        if resume_path is not None:
+            with open(resume_path, "rb") as snapshot_file:
+                self.resume_snapshot = snapshot_file.read()
+            horde = SNAPSHOT_HEADER.unpack_from(self.resume_snapshot)[4]  # resumes in the mode it was saved in
+        if record_path is not None and seed is None:  # a recorded session needs a seed for it to be replayed
+            seed = random.randrange(2 ** 32)
+        self._created_time = time.perf_counter()  # used to measure the time until the game can be started
+        self.time_to_interactive = None
         self.event_counter = 0
         self.canvas_width = 1024
         self.canvas_height = 490
-        self.canvas = Canvas(self.window, width=self.canvas_width, height=self.canvas_height,
-                             highlightthickness=0)
-        self.title_screen = TitleScreen(self.canvas, self.canvas_height, self.canvas_width)
-        self.game = Game(self.canvas, self.canvas_height, self.canvas_width, 100)
-        self.scoreboard = Scoreboard(self.canvas, self.canvas_height, self.canvas_width)
+        self.game = Game(self.canvas_height, self.canvas_width, 100, enemy_batch, background_mode, seed,
+                         enemy_pool_size, ai_lod, ai_update_budget, horde)
+        self.canvas = None
+        self.title_screen = None
+        self.view = None
+        self.scoreboard = None
+        if self.window is not None:
+            self.window.title("BEAT 'EM UP")
+            # the game is played at canvas_width by canvas_height, the view draws it at the render scale
+            render_scale = float(ScaledFrameCache.scale_fraction(render_scale))
+            self.canvas = Canvas(self.window, width=round(self.canvas_width * render_scale),
+                                 height=round(self.canvas_height * render_scale), highlightthickness=0)
+            self.view = GameView(self.canvas, self.game, render_scale, ScaledFrameCache(scale_variants))
+            self.title_screen = TitleScreen(self.canvas, self.canvas_height * render_scale,
+                                            self.canvas_width * render_scale, self.view.scaled_frames)
+            self.scoreboard = Scoreboard(self.canvas, self.canvas_height * render_scale,
+                                         self.canvas_width * render_scale)
+            self.window.bind('<F7>', lambda event: self.step_render_scale(-1))
+            self.window.bind('<F8>', lambda event: self.step_render_scale(1))
+            self.window.bind('<F5>', lambda event: self.quick_save())
+            self.window.bind('<F9>', lambda event: self.quick_load())
+        self.profile_output = profile_output  # the profile is written here when the window is closed
+        self.profiler_overlay = None
+        if profile is True:
+            self.game.profiler = TickProfiler()
+            if self.window is not None:
+                self.profiler_overlay = ProfilerOverlay(self.canvas, self.game.profiler,
+                                                        self.canvas_width * self.view.scale)
+                self.window.bind('<F3>', self.profiler_overlay.toggle)
+        if self.window is not None:
+            self.window.protocol("WM_DELETE_WINDOW", self.close)
         self.asset_list = ["giphy-6", "player", "player-left-move", "enemy", "enemy-left-move"]
+        self.asset_cache = AssetCache()
+        self.staged_loading = staged_loading  # assets are loaded between ticks while the title screen is displayed
+        self.asset_loader = None
+        self.asset_load_time_budget = 0.008  # seconds of each tick that can be spent decoding images
         self.game_difficulty = None  # difficulty is set here to be used in the game after chosen by user in title screen
         self.player = None  # this will be assigned to the player instance when game is set up
+        self.enemy_count = enemy_count  # number of enemies in the game, the difficulty is used when this is None
+        self.ticks_played = 0  # ticks played across every round, inputs are recorded against this
+        self.input_queue = InputQueue()  # key events wait here for the start of the next tick
+        self.key_logger = BufferedLogger(key_log)  # logs the key presses and releases that reach the player
+        self.logger = BufferedLogger(None if quiet is True else sys.stdout, max_lines=1)  # progress and round reports
+        self.quick_save_snapshot = None  # saved with F5 and loaded with F9
+        self.snapshots_saved = 0
+        self.snapshot_time = 0.0
+        self.input_recorder = None
+        if record_path is not None:
+            self.input_recorder = InputRecorder(record_path, seed, enemy_count, enemy_batch,
+                                                ai_update_budget if ai_lod is True else None, horde)
+        # game_process runs fixed length ticks so speeds and animation timing do not depend on the load of the host
+        self.tick_length = 0.01  # seconds of game time in a tick, sprite and animation speeds are given per tick
+        self.max_catch_up_ticks = 5  # most ticks run by one call of game_process when the game is behind
+        self.max_frame_skip = 4  # most frames that can be skipped in a row when the game is behind
+        self._accumulator = 0.0  # real time that has passed which has not been simulated yet
+        self._previous_time = None
+        self._frames_skipped = 0  # frames skipped in a row
+        self.frames_dropped = 0  # frames this round that were not drawn so the game could catch up
+        self.ticks_dropped = 0  # ticks this round never run as the game was too far behind to catch up
+        self.tick_rate = 0.0  # ticks run per second of real time, measured over the last second
+        self.frame_rate = 0.0  # frames drawn per second of real time, measured over the last second
+        self._rate_start_time = None
+        self._rate_ticks = 0
+        self._rate_frames = 0
+        self.checkpoint_path = checkpoint_path  # the round is saved here every checkpoint_interval seconds of play
+        self.checkpoint_interval = max(1, round(checkpoint_interval / self.tick_length))  # in ticks
 
     def bind_keys(self):
-        # first item in sprite_list is always the player sprite
-        self.window.bind('<KeyPress-a>', self.player.on_keypress)
-        self.window.bind('<KeyRelease-a>', self.player.on_keyrelease)
-        self.window.bind('<KeyPress-d>', self.player.on_keypress)
-        self.window.bind('<KeyRelease-d>', self.player.on_keyrelease)
-        self.window.bind('<KeyPress-space>', self.player.attack_action)
-        self.window.bind('<KeyPress-s>', self.player.duck_action)
+        if self.window is None:  # there are no key events to bind when running headless
+            return
+        # key events are queued and only reach the player at the start of the next tick
+        for key in InputQueue.press_inputs:
+            self.window.bind('<KeyPress-{}>'.format(key), lambda event: self.queue_input(event, True))
+            self.window.bind('<KeyRelease-{}>'.format(key), lambda event: self.queue_input(event, False))
         self.window.bind('Alt-s', lambda: None)  # prevents tkinter menu from popping up when alt is pressed
 
+    def queue_input(self, event, pressed):
+        if self.event_counter == 4:  # keys only reach the player in play while a round is running
+            self.input_queue.push(event.keysym, pressed)
+
+    def apply_input(self, input_type, keysym):  # called as the input queue is drained, records then applies the input
+        if self.input_recorder is not None:
+            self.input_recorder.record(self.ticks_played, input_type, ord(keysym) if len(keysym) == 1 else 0)
+        self.perform_input(input_type, keysym)
+
+    def perform_input(self, input_type, keysym):  # first item in sprite_list is always the player sprite
+        if input_type == INPUT_PRESS:
+            self.key_logger.log("press {} x velocity {}", keysym, self.player.velocity)
+            self.player.on_keypress(KeyEvent(keysym))
+        elif input_type == INPUT_RELEASE:
+            self.key_logger.log("release {} x velocity {}", keysym, self.player.velocity)
+            self.player.on_keyrelease(KeyEvent(keysym))
+            self.key_logger.log("finish release {} x velocity {}", keysym, self.player.velocity)
+        elif input_type == INPUT_ATTACK:
+            self.player.attack_action(KeyEvent(keysym))
+        elif input_type == INPUT_DUCK:
+            self.player.duck_action(KeyEvent(keysym))
+
     def load_assets(self):  # loads and stores images, can load any length gif.
         # allow this function to load images from multiple files / directories and store in different vars
-        frames = []
-        frame_counter = 0
-        print("LOADING ASSETS")
+        self.logger.log("LOADING ASSETS")
+        start_time = time.perf_counter()
         for item in self.asset_list:
-            while True:
-                try:
-                    frames.append(PhotoImage(file="images/{}.gif".format(item), format="gif -index {}"
-                                             .format(frame_counter)))
-                    frame_counter += 1
-                except TclError:
-                    break
-
-            if item == self.asset_list[0]:
-                self.game.background_image_list = frames
-            # all image assets for sprites must be stored as follows
-            # 0, 5 walking & 6, 7 ducking & 8, 11 attacking
-            elif item == self.asset_list[1]:
-                self.game.player_image_list_right = frames
-            elif item == self.asset_list[2]:
-                self.game.player_image_list_left = frames
-            elif item == self.asset_list[3]:
-                self.game.enemy_image_list_right = frames
-                print(len(frames))
-            elif item == self.asset_list[4]:
-                self.game.enemy_image_list_left = frames
-                print(len(frames))
-            # resets variables to be able to load more images and store them in game
-            frames = []
-            frame_counter = 0
+            if self.window is None:  # a headless game only needs a placeholder for each frame of the animation
+                with open(os.path.join(IMAGE_DIRECTORY, "{}.gif".format(item)), "rb") as gif_file:
+                    frames = list(range(gif_frame_count(gif_file.read())))
+            else:
+                frames = self.asset_cache.load(item)  # decoded gif frames are cached on disk between starts
+            self.store_asset(item, frames)
+        self.logger.log("ASSETS LOADED IN {:.0f}ms, {} FROM CACHE, {} DECODED",
+            (time.perf_counter() - start_time) * 1000, self.asset_cache.hits, self.asset_cache.misses)
+
+    def load_assets_step(self):  # continues loading assets in the background, called every tick until they are loaded
+        self.asset_loader.step(self.asset_load_time_budget)
+        self.title_screen.display_loading_progress(len(self.asset_loader.loaded), len(self.asset_list))
+        if self.asset_loader.done:
+            for item in self.asset_list:
+                self.store_asset(item, self.asset_loader.loaded[item])
+            self.logger.log("ASSETS LOADED, {} FROM CACHE, {} DECODED", self.asset_cache.hits, self.asset_cache.misses)
+            self.asset_loader = None
+            self.report_time_to_interactive()
+
+    def step_render_scale(self, step):  # called with keypress of F7 or F8, moves to the next smaller or larger scale
+        scales = sorted(set(RENDER_SCALES) | {self.view.scale})
+        index = min(max(scales.index(self.view.scale) + step, 0), len(scales) - 1)
+        self.set_render_scale(scales[index])
+
+    def set_render_scale(self, render_scale):
+        self.view.set_scale(render_scale)
+        for screen in (self.title_screen, self.scoreboard):  # placed at the new size the next time they are displayed
+            screen.canvas_width = self.canvas_width * self.view.scale
+            screen.canvas_height = self.canvas_height * self.view.scale
+        if self.profiler_overlay is not None:
+            self.profiler_overlay.canvas_width = self.canvas_width * self.view.scale
+        scaled_frames = self.view.scaled_frames
+        self.logger.log("RENDER SCALE: {}, {} SCALED VARIANTS RESIDENT, {} FRAMES, {:.0f}KiB, {} EVICTED",
+            self.view.scale, len(scaled_frames.variants), scaled_frames.resident_frames,
+            scaled_frames.resident_bytes / 1024, scaled_frames.evictions)
+
+    def report_time_to_interactive(self):  # the time from creating the game until the title screen can be used
+        self.time_to_interactive = time.perf_counter() - self._created_time
+        self.logger.log("TIME TO INTERACTIVE: {:.0f}ms", self.time_to_interactive * 1000)
+
+    def store_asset(self, item, frames):  # stores the frames of an animation in the game
+        if item == self.asset_list[0]:
+            self.game.background_image_list = frames
+        # all image assets for sprites must be stored as follows
+        # 0, 5 walking & 6, 7 ducking & 8, 11 attacking
+        elif item == self.asset_list[1]:
+            self.game.player_image_list_right = frames
+        elif item == self.asset_list[2]:
+            self.game.player_image_list_left = frames
+        elif item == self.asset_list[3]:
+            self.game.enemy_image_list_right = frames
+        elif item == self.asset_list[4]:
+            self.game.enemy_image_list_left = frames
+        if self.view is not None:
+            self.view.scaled_frames.scale_frames(frames)
 
     def create_enemies(self):  # creates enemies based on difficulty
+        if self.game.horde is not None:  # the waves spawn the enemies, higher difficulties start on later waves
+            self.game.horde.start(self.game_difficulty)
+            return
         number_of_enemies = self.game_difficulty  # difficulty determines number in game
+        if self.enemy_count is not None:
+            number_of_enemies = self.enemy_count
         while len(self.game.sprite_list) < number_of_enemies + 1:  # add one for player already in sprite_list
             self.game.create_enemy(self.game_difficulty)
 
-    def game_process(self):  # controls game events and flow across different game states
+    def game_state(self):  # advances the game by one tick across the different game states
+        if self.asset_loader is not None:
+            self.load_assets_step()
+
         if self.event_counter == 0:  # this function only runs once to set up game initally
-            print("Title Screen displayed")
-            self.canvas.pack()
-            self.load_assets()  # loads asset images for use in game
+            self.logger.log("Title Screen displayed")
+            if self.canvas is not None:
+                self.canvas.pack()
+            if self.window is not None and self.staged_loading is True:  # title screen is displayed while assets load
+                self.asset_loader = AssetLoader(self.asset_cache, self.asset_list)
+                self.asset_loader.start()
+                self.title_screen.display_loading_progress(0, len(self.asset_list))
+            else:
+                self.load_assets()  # loads asset images for use in game
             self.event_counter += 1
 
         elif self.event_counter == 1:  # displays menu
             self.title_screen.display_title_screen()
+            if self.time_to_interactive is None and self.asset_loader is None:  # assets were loaded before the menu
+                self.report_time_to_interactive()
             self.event_counter += 1
 
-        elif self.title_screen.start is True and self.event_counter == 2:  # removes title screen when game starts
-            print("Title Screen removed")
+        elif self.event_counter == 2 and self.resume_snapshot is not None and self.asset_loader is None:
+            # continues a round saved before the game was closed
+            self.logger.log("Title Screen removed, resuming saved round")
+            self.title_screen.remove_title_screen()
+            self.load_snapshot(self.resume_snapshot)
+            self.resume_snapshot = None
+
+        elif self.event_counter == 2 and self.title_screen.start is True:  # removes title screen when game starts
+            self.logger.log("Title Screen removed")
             self.title_screen.remove_title_screen()
             self.game_difficulty = self.title_screen.difficulty_scale.get()
-            print("GAME DIFFICULTY: {}".format(self.game_difficulty))
+            self.logger.log("GAME DIFFICULTY: {}", self.game_difficulty)
+            if self.input_recorder is not None:
+                self.input_recorder.record(self.ticks_played, INPUT_START, self.game_difficulty)
             self.event_counter += 1
 
         elif self.event_counter == 3:  # set up the game
-            print("Running Game setup")
+            self.logger.log("Running Game setup")
             self.game.display_health_bar()
             self.player = self.game.create_player()  # player is always created before enemy sprites
             self.create_enemies()
+            self.input_queue.clear()  # keys held in the last round are not held by the new player
+            self.frames_dropped = 0  # dropped frames and ticks are reported for each round
+            self.ticks_dropped = 0
             self.bind_keys()  # binds keys for player movement
             self.event_counter += 1
 
         elif self.event_counter == 4 and self.player.health > 0:  # while game is not over
-            self.game.change_background_image()  # animate background image
-            sprite_list = len(self.game.sprite_list)
-            for i in range(len(self.game.sprite_list)):
-                self.game.display_sprites(i)
-                if self.game.sprite_list[i] != self.player:  # controls actions of enemies in game
-                    enemy = self.game.sprite_list[i]  # stores enemy
-                    enemy_velocity_change = enemy.calculate_movement(self.player)
-                    enemy.change_movement(enemy_velocity_change)
-                    enemy.move()  # moves enemy based on calculated dynamic movement in response to player actions
-                    overlapping = self.game.find_overlapping(self.player, enemy)
-                    self.game.sprite_interaction(self.player, enemy, overlapping)  # determines interactions between player and enemy depending on if they are overlapping
-                    if enemy.health <= 0:
-                        enemy_dead = True
-                    else:
-                        enemy_dead = False
-                    self.game.update_score(enemy_dead, enemy)  # updates score if enemy is defeated
-                    self.game.remove_sprite(enemy_dead, enemy)  # removes enemy if it is defeated
-                    if len(self.game.sprite_list) < sprite_list:  # if an enemy has been defeated and removed
-                        self.game.create_enemy(self.game_difficulty)  # replace dead enemy
-                        break  # breaks loop when enemy is removed from game
-                else:
-                    self.player.move()
-                self.game.update_health_bar(self.player)  # updates the health bar
+            self.input_queue.drain(self.apply_input)  # key events since the last tick are applied at its start
+            self.game.update(self.player, self.game_difficulty)
+            self.ticks_played += 1
+            if self.checkpoint_path is not None and self.game.ticks % self.checkpoint_interval == 0:
+                self.write_checkpoint()
 
         elif self.event_counter == 4 and self.player.health <= 0:  # checks game has finished
-            print("Reset game all game values to default")
+            self.report_round()
+            if self.checkpoint_path is not None and os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)  # there is nothing to recover once the round is over
+            self.logger.log("Reset game all game values to default")
             self.game.update_health_bar(self.player)  # resets health bar
             self.game.reset()  # resets the game values
-            self.title_screen.start = False  # resets game menu
+            if self.title_screen is not None:
+                self.title_screen.start = False  # resets game menu
             self.event_counter += 1
 
         elif self.event_counter == 5:  # displays the scoreboard
             self.scoreboard.display_scoreboard(self.game.score, self.game_difficulty)
             self.event_counter += 1
 
-        elif self.scoreboard.restart is True and self.event_counter == 6:
+        elif self.event_counter == 6 and self.scoreboard.restart is True:
             self.scoreboard.restart = False
             self.scoreboard.remove_scoreboard()
             self.game.score = 0
             self.event_counter = 1  # restarts game
 
-        self.window.after(10, self.game_process)
-
+    def save_snapshot(self):  # the state of the round being played as bytes
+        start_time = time.perf_counter()
+        snapshot = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.game_difficulty, self.ticks_played,
+                                        self.game.horde is not None) + self.game.save_state()
+        self.snapshot_time += time.perf_counter() - start_time
+        self.snapshots_saved += 1
+        return snapshot
+
+    def load_snapshot(self, snapshot):  # continues the round saved in a snapshot, during a round or from the menu
+        magic, version, difficulty, ticks_played, horde = SNAPSHOT_HEADER.unpack_from(snapshot)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("not a version {} snapshot".format(SNAPSHOT_VERSION))
+        if horde != (self.game.horde is not None):
+            raise ValueError("the snapshot was saved in a different game mode")
+        self.game.load_state(snapshot, SNAPSHOT_HEADER.size)
+        self.player = self.game.sprite_list[0]
+        self.game_difficulty = difficulty
+        self.ticks_played = ticks_played
+        self.input_queue.clear()  # keys held now are pressed again rather than ignored as repeats
+        if self.event_counter != 4:
+            self.bind_keys()
+            self.event_counter = 4
+        if self.view is not None:
+            self.view.reset()  # the canvas items are rebuilt from the restored sprites on the next draw
+
+    def write_checkpoint(self):  # saves the round so it can be resumed if the game closes, the old file is replaced
+        temporary_path = self.checkpoint_path + ".tmp"
+        with open(temporary_path, "wb") as checkpoint_file:
+            checkpoint_file.write(self.save_snapshot())
+        os.replace(temporary_path, self.checkpoint_path)  # a crash while writing leaves the previous checkpoint
+
+    def quick_save(self):  # called with keypress of F5
+        if self.game.enemy_batch is not None:
+            self.logger.log("QUICK SAVE IS NOT SUPPORTED WITH BATCHED ENEMIES")
+            return
+        if self.event_counter == 4 and self.player.health > 0:
+            self.quick_save_snapshot = self.save_snapshot()
+            if self.checkpoint_path is not None:
+                self.write_checkpoint()
+
+    def quick_load(self):  # called with keypress of F9, a recorded session would no longer replay so it is ignored
+        if self.game.enemy_batch is not None:
+            self.logger.log("QUICK LOAD IS NOT SUPPORTED WITH BATCHED ENEMIES")
+            return
+        if self.event_counter == 4 and self.quick_save_snapshot is not None and self.input_recorder is None:
+            self.load_snapshot(self.quick_save_snapshot)
 
-window = Tk()
-MAIN = Main(window)
-MAIN.game_process()
-window.mainloop()
+    def game_process(self):  # controls game events and flow across different game states
+        current_time = time.perf_counter()
+        if self._previous_time is None:
+            self._previous_time = current_time - self.tick_length  # first call always runs a tick
+            self._rate_start_time = current_time
+        self._accumulator += current_time - self._previous_time
+        self._previous_time = current_time
+
+        ticks = 0
+        while self._accumulator >= self.tick_length and ticks < self.max_catch_up_ticks:
+            self.game_state()
+            self._accumulator -= self.tick_length
+            ticks += 1
+        behind = self._accumulator >= self.tick_length
+        if self._accumulator > self.max_catch_up_ticks * self.tick_length:
+            # too far behind to catch up, e.g. after loading assets, so the time is dropped and the game slows down
+            dropped_ticks = int(self._accumulator / self.tick_length)
+            self.ticks_dropped += dropped_ticks
+            self._accumulator -= dropped_ticks * self.tick_length
+
+        if ticks > 0 and behind and self._frames_skipped < self.max_frame_skip:  # skip drawing to catch up sooner
+            self.frames_dropped += 1
+            self._frames_skipped += 1
+        elif ticks > 0:
+            render_start = time.perf_counter()
+            self.view.draw()  # the canvas mirrors the game state after the ticks have run
+            self.input_queue.frame_drawn(time.perf_counter())
+            if self.game.profiler is not None:
+                self.game.profiler.record_render(time.perf_counter() - render_start)
+            if self.profiler_overlay is not None:
+                self.profiler_overlay.update()
+            self._frames_skipped = 0
+            self._rate_frames += 1
+        self._update_rates(current_time, ticks)
+
+        delay = max(0, int((self.tick_length - self._accumulator) * 1000))  # milliseconds until the next tick is due
+        self.window.after(delay, self.game_process)
+
+    def close(self):  # closes the window, writing the profile first if one was asked for
+        if self.game.profiler is not None and self.profile_output is not None:
+            self.game.profiler.dump(self.profile_output)
+            self.logger.log("PROFILE WRITTEN TO {}", self.profile_output)
+        if self.input_recorder is not None:
+            self.input_recorder.close(self.ticks_played)
+            self.logger.log("{} INPUTS RECORDED", self.input_recorder.records)
+        self.key_logger.flush()
+        self.window.destroy()
+
+    def report_round(self):  # prints the timing of the round that has just ended
+        self.logger.log("TICK RATE: {:.1f}/s, FRAME RATE: {:.1f}/s, FRAMES DROPPED: {}, TICKS DROPPED: {}",
+            self.tick_rate, self.frame_rate, self.frames_dropped, self.ticks_dropped)
+        self.logger.log("BACKGROUND ANIMATION: {:.4f}ms/tick, {} FRAME CHANGES IN {} TICKS",
+            self.game.background_time * 1000 / max(self.game.ticks, 1), self.game.background_animator.frame_changes,
+            self.game.ticks)
+        if self.view is not None and self.view.frames > 0:
+            self.logger.log("CANVAS OPERATIONS: {:.1f}/frame, {:.1f}/frame WITHOUT RETAINED DRAWING",
+                self.view.total_ops / self.view.frames, self.view.unbatched_ops / self.view.frames)
+        enemy_pool = self.game.enemy_pool
+        images_reused = self.view.images_reused if self.view is not None else 0
+        self.logger.log("ENEMY POOL: {} HITS, {} MISSES, {} CANVAS IMAGES REUSED, {} ALLOCATIONS AVOIDED",
+            enemy_pool.hits, enemy_pool.misses, images_reused, enemy_pool.allocations_avoided + images_reused)
+        latency = self.input_queue.latency_percentiles()
+        if latency is not None:
+            self.logger.log("INPUT LATENCY: p50 {:.1f}ms, p95 {:.1f}ms FROM KEY EVENT TO FRAME, {} KEY REPEATS IGNORED",
+                latency[0] * 1000, latency[1] * 1000, self.input_queue.repeats_ignored)
+        self.key_logger.flush()
+        if self.game.horde is not None:
+            self.logger.log("HORDE: REACHED WAVE {}, {} OF ITS {} ENEMIES DEFEATED",
+                self.game.horde.wave_number, self.game.horde.defeated, self.game.horde.wave.enemies)
+        if self.snapshots_saved > 0:
+            self.logger.log("SNAPSHOTS: {} SAVED, {:.0f}us EACH",
+                self.snapshots_saved, self.snapshot_time * 1e6 / self.snapshots_saved)
+        ai_scheduler = self.game.ai_scheduler
+        if ai_scheduler is not None and self.game.enemy_batch is None:
+            self.logger.log("ENEMY AI: {} UPDATES, {} SKIPPED FAR FROM THE PLAYER, {} DEFERRED OVER THE BUDGET OF "
+                            "{}/TICK", ai_scheduler.updates, ai_scheduler.skipped, ai_scheduler.deferred,
+                            ai_scheduler.update_budget)
+
+    def _update_rates(self, current_time, ticks):  # measures the real tick rate and frame rate every second
+        self._rate_ticks += ticks
+        elapsed = current_time - self._rate_start_time
+        if elapsed >= 1:
+            self.tick_rate = self._rate_ticks / elapsed
+            self.frame_rate = self._rate_frames / elapsed
+            self._rate_start_time = current_time
+            self._rate_ticks = 0
+            self._rate_frames = 0
+
+    def start_round(self, difficulty):  # sets up a round without the title screen, returns the score of the last round
+        if self.event_counter == 0:
+            self.game_state()  # loads assets
+        if self.event_counter == 4 and self.player.health > 0:
+            raise ValueError("a round is already being played")
+        if self.event_counter == 4:
+            self.game_state()  # ends the round the player died in
+        score = self.game.score if self.event_counter == 5 else 0
+        self.game.score = 0
+        self.game_difficulty = difficulty
+        self.event_counter = 3  # there is no scoreboard or title screen to click through
+        self.game_state()
+        return score
+
+    def run_headless(self, difficulty, max_ticks=None):  # plays a round without a window, returns the ticks played
+        if self.event_counter != 4 or self.player.health <= 0:
+            self.start_round(difficulty)
+        ticks = 0
+        while self.event_counter < 5 and (max_ticks is None or ticks < max_ticks):  # state 5 is the end of a round
+            self.game_state()
+            ticks += 1
+        return ticks
+
+    def replay(self, records):  # plays back recorded input headless without waiting between ticks
+        if self.event_counter == 0:
+            self.game_state()  # loads assets
+        for tick, input_type, value in records:
+            while self.ticks_played < tick:  # plays the ticks that passed before the input happened
+                if self.event_counter != 4 or self.player.health <= 0:
+                    raise ValueError("replay diverged from the recording at tick {}".format(self.ticks_played))
+                self.game_state()
+            if input_type == INPUT_START:  # the player chose a difficulty and started a round
+                self.start_round(value)
+            elif input_type != INPUT_END:
+                self.perform_input(input_type, chr(value) if value != 0 else "space")
+        return self.ticks_played
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BEAT 'EM UP")
+    parser.add_argument("--enemy-batch", action="store_true", help="update all enemies at once with numpy")
+    parser.add_argument("--background", choices=BackgroundAnimator.modes, default="animated",
+                        help="reduced or static backgrounds redraw less often on low power hosts")
+    parser.add_argument("--profile", action="store_true", help="time each phase of a tick, F3 toggles the overlay")
+    parser.add_argument("--profile-output", metavar="FILE",
+                        help="write the profile to a .json or .csv file on exit, implies --profile")
+    parser.add_argument("--enemy-pool", type=int, default=16, metavar="SIZE",
+                        help="defeated enemies and their images kept for reuse, 0 turns pooling off")
+    parser.add_argument("--ai-lod", action="store_true",
+                        help="run the AI of enemies far from the player less often instead of on every tick")
+    parser.add_argument("--ai-budget", type=int, default=AI_UPDATE_BUDGET, metavar="UPDATES",
+                        help="enemy AI updates per tick with --ai-lod before enemies far from the player are deferred")
+    parser.add_argument("--scale", type=float, default=1,
+                        help="size the game is drawn at, 1 is 1024x490, F7 and F8 change it while playing")
+    parser.add_argument("--scale-variants", type=int, default=2, metavar="COUNT",
+                        help="scaled copies of the frames kept for scales other than 1, least recently used are freed")
+    parser.add_argument("--log-keys", action="store_true", help="log the presses and releases that reach the player")
+    parser.add_argument("--horde", action="store_true",
+                        help="enemies attack in escalating waves of up to hundreds, the difficulty sets the first wave")
+    parser.add_argument("--seed", type=int, help="seed for the enemies, the same seed and input play the same game")
+    parser.add_argument("--record", metavar="FILE", help="record the seed and every input to a replayable log")
+    parser.add_argument("--replay", metavar="FILE", help="play a recorded log back headless as fast as possible")
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help="save the round to a snapshot every few seconds so it can be resumed after a crash")
+    parser.add_argument("--checkpoint-interval", type=float, default=5, metavar="SECONDS")
+    parser.add_argument("--resume", metavar="FILE", help="continue the round saved in a snapshot or checkpoint")
+    arguments = parser.parse_args()
+    if arguments.enemy_batch and (arguments.checkpoint is not None or arguments.resume is not None):
+        parser.error("snapshots are not supported with --enemy-batch")
+    if arguments.record is not None and arguments.resume is not None:
+        parser.error("a resumed round cannot be recorded as the log would not replay it")
+    if arguments.ai_budget < 1:
+        parser.error("--ai-budget must be at least 1")
+    if arguments.scale_variants < 1:
+        parser.error("--scale-variants must be at least 1")
+    profile = arguments.profile or arguments.profile_output is not None
+    if arguments.replay is not None:
+        replay_seed, replay_enemy_count, replay_enemy_batch, replay_ai_update_budget, replay_horde, replay_records = \
+            read_input_log(arguments.replay)
+        MAIN = Main(enemy_batch=replay_enemy_batch, background_mode=arguments.background, profile=profile,
+                    seed=replay_seed, enemy_count=replay_enemy_count, enemy_pool_size=arguments.enemy_pool,
+                    ai_lod=replay_ai_update_budget is not None,
+                    ai_update_budget=replay_ai_update_budget or AI_UPDATE_BUDGET,
+                    horde=replay_horde)
+        replay_start = time.perf_counter()
+        replay_ticks = MAIN.replay(replay_records)
+        replay_time = time.perf_counter() - replay_start
+        print("REPLAYED {} TICKS IN {:.2f}s, {:.0f} TICKS/s, SCORE {}".format(
+            replay_ticks, replay_time, replay_ticks / max(replay_time, 1e-9), MAIN.game.score))
+        if profile is True:
+            print(json.dumps(MAIN.game.profiler.summary(), indent=1))
+            if arguments.profile_output is not None:
+                MAIN.game.profiler.dump(arguments.profile_output)
+    else:
+        window = Tk()
+        MAIN = Main(window, enemy_batch=arguments.enemy_batch, background_mode=arguments.background,
+                    profile=profile, profile_output=arguments.profile_output, seed=arguments.seed,
+                    record_path=arguments.record, enemy_pool_size=arguments.enemy_pool,
+                    ai_lod=arguments.ai_lod, ai_update_budget=arguments.ai_budget,
+                    horde=arguments.horde, render_scale=arguments.scale, scale_variants=arguments.scale_variants,
+                    key_log=sys.stdout if arguments.log_keys else None, checkpoint_path=arguments.checkpoint,
+                    checkpoint_interval=arguments.checkpoint_interval,
+                    resume_path=arguments.resume)
+        MAIN.game_process()
+        window.mainloop()
@@ -0,0 +1,69 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import INPUT_ATTACK, INPUT_DUCK, INPUT_PRESS, INPUT_RELEASE, InputQueue
+
+
+def drain(queue, events):  # pushes the events of one tick and returns the inputs applied at the start of the next
+    for keysym, pressed in events:
+        queue.push(keysym, pressed)
+    applied = []
+    queue.drain(lambda input_type, keysym: applied.append((input_type, keysym)))
+    return applied
+
+
+class InputQueueTest(unittest.TestCase):
+    def test_press_and_release_in_one_tick(self):  # a tap shorter than a tick still moves the player for that tick
+        queue = InputQueue()
+        self.assertEqual(drain(queue, [("d", True), ("d", False)]), [(INPUT_PRESS, "d"), (INPUT_RELEASE, "d")])
+        self.assertEqual(queue.held_keys, set())
+
+    def test_key_repeat_is_ignored(self):  # tkinter sends a release then a press for each repeat of a held key
+        queue = InputQueue()
+        self.assertEqual(drain(queue, [("a", True)]), [(INPUT_PRESS, "a")])
+        self.assertEqual(drain(queue, [("a", False), ("a", True), ("a", False), ("a", True)]), [])
+        self.assertEqual(queue.repeats_ignored, 2)
+        self.assertEqual(queue.held_keys, {"a"})
+        self.assertEqual(drain(queue, [("a", False)]), [(INPUT_RELEASE, "a")])
+
+    def test_action_key_repeats(self):  # holding space keeps attacking, as it did when tkinter called attack_action
+        queue = InputQueue()
+        self.assertEqual(drain(queue, [("space", True)]), [(INPUT_ATTACK, "space")])
+        self.assertEqual(drain(queue, [("space", False), ("space", True)]), [(INPUT_ATTACK, "space")])
+        self.assertEqual(drain(queue, [("s", True), ("s", False), ("s", True)]), [(INPUT_DUCK, "s"), (INPUT_DUCK, "s")])
+        self.assertEqual(queue.repeats_ignored, 0)
+        self.assertEqual(queue.held_keys, {"space", "s"})
+
+    def test_releases_come_after_presses(self):
+        queue = InputQueue()
+        drain(queue, [("a", True)])
+        applied = drain(queue, [("a", False), ("d", True), ("space", True), ("s", True)])
+        self.assertEqual(applied, [(INPUT_PRESS, "d"), (INPUT_ATTACK, "space"), (INPUT_DUCK, "s"),
+                                   (INPUT_RELEASE, "a")])
+        self.assertEqual(queue.held_keys, {"d", "space", "s"})
+
+    def test_only_movement_keys_are_released(self):
+        queue = InputQueue()
+        drain(queue, [("space", True), ("s", True)])
+        self.assertEqual(drain(queue, [("space", False), ("s", False)]), [])
+        self.assertEqual(queue.held_keys, set())
+
+    def test_release_of_key_not_held_is_ignored(self):  # the key went down before the window had focus
+        queue = InputQueue()
+        self.assertEqual(drain(queue, [("d", False)]), [])
+        self.assertEqual(drain(queue, []), [])
+
+    def test_clear(self):
+        queue = InputQueue()
+        drain(queue, [("a", True)])
+        queue.push("d", True)
+        queue.clear()
+        self.assertEqual(drain(queue, []), [])
+        self.assertEqual(queue.held_keys, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
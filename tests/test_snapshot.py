@@ -0,0 +1,62 @@
+import copy
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def start_game(seed, enemy_count=None, ai_lod=False, horde=False):  # a game in its first round, as the benchmark does
+    game = main.Main(seed=seed, enemy_count=enemy_count, ai_lod=ai_lod, ai_update_budget=50, horde=horde, quiet=True)
+    game.start_round(3)
+    return game
+
+
+def play(game, scripted_player, ticks):
+    for _ in range(ticks):
+        game.player.health = (0, 100)  # the player never dies so the round never ends on the scoreboard
+        scripted_player.press_keys(game.player, game.game.ticks)
+        game.game_state()
+
+
+class SnapshotTest(unittest.TestCase):
+    def assert_round_trip(self, enemy_count=None, ai_lod=False, horde=False):
+        played = start_game(5, enemy_count, ai_lod, horde)
+        scripted_player = main.ScriptedPlayer(5, 20)
+        play(played, scripted_player, 300)
+        snapshot = played.save_snapshot()
+        restored = start_game(99, enemy_count, ai_lod, horde)  # a different seed so nothing carries over by chance
+        restored.load_snapshot(snapshot)
+        self.assertEqual(restored.save_snapshot(), snapshot)
+        restored_player = copy.deepcopy(scripted_player)
+        play(played, scripted_player, 400)
+        play(restored, restored_player, 400)
+        self.assertEqual(restored.save_snapshot(), played.save_snapshot())
+
+    def test_round_trip(self):
+        self.assert_round_trip(enemy_count=8)
+
+    def test_round_trip_with_lod(self):
+        self.assert_round_trip(enemy_count=64, ai_lod=True)
+
+    def test_round_trip_horde(self):
+        self.assert_round_trip(horde=True)
+
+    def test_snapshot_switches_lod_on(self):  # the AI budget comes from the snapshot, not the game it is loaded into
+        played = start_game(3, 64, ai_lod=True)
+        play(played, main.ScriptedPlayer(3, 20), 200)
+        restored = start_game(3, 64)
+        restored.load_snapshot(played.save_snapshot())
+        self.assertEqual(restored.game.ai_scheduler.update_budget, 50)
+        self.assertEqual(restored.save_snapshot(), played.save_snapshot())
+
+    def test_bad_snapshot(self):
+        game = start_game(1, 4)
+        with self.assertRaises(ValueError):
+            game.load_snapshot(b"not a snapshot")
+
+
+if __name__ == "__main__":
+    unittest.main()
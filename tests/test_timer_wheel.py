@@ -0,0 +1,99 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import TimerWheel
+
+
+class NaiveScheduler:  # keeps the timers by the tick they are due on, slow but obviously right
+    def __init__(self):
+        self.tick = 0
+        self.timers = {}
+
+    def schedule(self, delay, callback, interval=None):
+        timer = [self.tick + delay, callback, interval, True]
+        self.timers.setdefault(timer[0], []).append(timer)
+        return timer
+
+    def advance(self):
+        while self.timers.get(self.tick):  # timers scheduled by callbacks for this tick fire as well
+            for timer in self.timers.pop(self.tick):
+                if timer[3] is True:
+                    timer[1]()
+                    if timer[2] is not None and timer[3] is True:
+                        timer[0] += timer[2]
+                        self.timers.setdefault(timer[0], []).append(timer)
+        self.tick += 1
+
+
+def cancel(timer):
+    if isinstance(timer, list):
+        timer[3] = False
+    else:
+        timer.cancel()
+
+
+def run_schedule(scheduler, seed, ticks, max_delay):  # returns the ids fired on each tick, in no particular order
+    rng = random.Random(seed)
+    fired = [set() for _ in range(ticks)]
+    timers = []
+
+    def make_callback(timer_id):
+        def callback():
+            fired[scheduler.tick].add(timer_id)
+            if timer_id % 7 == 0:  # some callbacks schedule more timers, some of them due on the same tick
+                timers.append(scheduler.schedule(timer_id % 3, make_callback(timer_id * 10 + 1)))
+        return callback
+
+    next_id = 1
+    for tick in range(ticks):
+        for _ in range(rng.randrange(3)):
+            delay = rng.choice((rng.randrange(64), rng.randrange(64, 4096), rng.randrange(4096, max_delay)))
+            interval = rng.choice((None, None, rng.randrange(1, 200)))
+            timers.append(scheduler.schedule(delay, make_callback(next_id * 100), interval))
+            next_id += 1
+        if timers and rng.random() < 0.2:
+            cancel(timers[rng.randrange(len(timers))])
+        scheduler.advance()
+    return fired
+
+
+class TimerWheelTest(unittest.TestCase):
+    def assert_matches_naive(self, wheel, seed, ticks, max_delay):
+        expected = run_schedule(NaiveScheduler(), seed, ticks, max_delay)
+        actual = run_schedule(wheel, seed, ticks, max_delay)
+        for tick in range(ticks):
+            self.assertEqual(actual[tick], expected[tick], "tick {}".format(tick))
+
+    def test_matches_naive_scheduler(self):
+        self.assert_matches_naive(TimerWheel(), 1, 6000, 8000)
+
+    def test_cascades_through_overflow(self):  # a two level wheel only reaches 4096 ticks ahead
+        self.assert_matches_naive(TimerWheel(levels=2), 2, 12000, 10000)
+
+    def test_long_delays(self):
+        wheel = TimerWheel()
+        fired = []
+        for delay in (0, 63, 64, 4095, 4096, 262143, 262144, 300000):
+            wheel.schedule(delay, lambda delay=delay: fired.append((wheel.tick, delay)))
+        for _ in range(300001):
+            wheel.advance()
+        self.assertEqual(fired, [(delay, delay) for delay in (0, 63, 64, 4095, 4096, 262143, 262144, 300000)])
+
+    def test_cancelled_repeating_timer_stops(self):
+        wheel = TimerWheel()
+        fired = []
+        timer = wheel.schedule(5, lambda: fired.append(wheel.tick), interval=10)
+        for _ in range(30):
+            wheel.advance()
+        timer.cancel()
+        for _ in range(100):
+            wheel.advance()
+        self.assertEqual(fired, [5, 15, 25])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,464 @@
+from tkinter import *
+import argparse
+import heapq
+import os
+import random
+import socket
+import struct
+import sys
+import time
+import zlib
+
+import main
+
+__author__ = "Jack Ashton"
+
+INPUT_LEFT, INPUT_RIGHT, INPUT_ATTACK, INPUT_DUCK = 1, 2, 4, 8  # bits of the input a player sends for each tick
+KEY_INPUTS = {"a": INPUT_LEFT, "d": INPUT_RIGHT, "space": INPUT_ATTACK, "s": INPUT_DUCK}
+ACTION_INPUTS = {"left": INPUT_LEFT, "right": INPUT_RIGHT, "attack": INPUT_ATTACK, "duck": INPUT_DUCK, "idle": 0}
+MATCH_STATE = struct.Struct("<IBB")  # tick, input of each player on the last tick, followed by each player's state
+INPUT_PACKET = struct.Struct("<IiB")
+# tick of the first input, last tick of the receiver's input the sender has without a gap, number of inputs,
+# followed by one byte for each input
+VERSUS_ASSETS = (("giphy-6", "background_image_list"), ("player", "player_image_list_right"),
+                 ("player-left-move", "player_image_list_left"))
+TICK_LENGTH = 0.01  # seconds in a tick, the same as Main
+
+
+def create_game(windowed):  # game holding the frames of the background and players, placeholders when headless
+    game = main.Game(490, 1024, 100)
+    asset_cache = main.AssetCache()
+    for name, attribute in VERSUS_ASSETS:
+        if windowed is True:
+            frames = asset_cache.load(name)
+        else:  # only the number of frames matters without a window
+            with open(os.path.join(main.IMAGE_DIRECTORY, "{}.gif".format(name)), "rb") as gif_file:
+                frames = list(range(main.gif_frame_count(gif_file.read())))
+        setattr(game, attribute, frames)
+    return game
+
+
+class VersusMatch:  # two players fighting each other, the same inputs on every tick always play the same match
+    def __init__(self, game):
+        self.game = game  # holds the frames, and the sprite list drawn by a GameView
+        self.timers = main.TimerWheel()  # frame timers of the players, apart from the game's so they can be rolled back
+        self.players = []
+        for x, direction in ((game.canvas_width / 4, "right"),
+                             (game.canvas_width * 3 / 4 - main.Player.image_width, "left")):
+            player = game.create_player()
+            player.start_animation(self.timers)
+            player.display_sprite(direction, image_index=0, x_coordinates=x)
+            player.visibility = True
+            self.players.append(player)
+        self.inputs = [0, 0]  # input of each player on the last tick, keys are pressed and released on its edges
+
+    @property
+    def tick(self):  # ticks played
+        return self.timers.tick
+
+    @property
+    def finished(self):  # the round ends when either player runs out of health
+        return any(player.health <= 0 for player in self.players)
+
+    @property
+    def winner(self):  # index of the player left standing, None for a draw or before the round has finished
+        standing = [i for i, player in enumerate(self.players) if player.health > 0]
+        return standing[0] if len(standing) == 1 else None
+
+    def apply_input(self, player, previous_input, current_input):  # presses and releases keys on the edges of an input
+        changed = previous_input ^ current_input
+        if changed == 0:
+            return
+        for key in ("a", "d"):
+            if changed & KEY_INPUTS[key] and current_input & KEY_INPUTS[key]:
+                player.on_keypress(main.KeyEvent(key))
+            elif changed & KEY_INPUTS[key]:
+                player.on_keyrelease(main.KeyEvent(key))
+        if changed & current_input & INPUT_ATTACK:
+            player.attack_action(main.KeyEvent("space"))
+        if changed & current_input & INPUT_DUCK:
+            player.duck_action(main.KeyEvent("s"))
+
+    def strike(self, attacker, defender):  # the same rule as the player striking an enemy
+        if attacker.attack is True and attacker.frame_ending and \
+                attacker.current_image_index == attacker.final_attack_image_index and \
+                attacker.previous_direction != defender.previous_direction and defender.duck is not True:
+            defender.health = (1, attacker.attack_damage)
+
+    def step(self, inputs):  # plays one tick with the input of each player
+        for player, previous_input, current_input in zip(self.players, self.inputs, inputs):
+            self.apply_input(player, previous_input, current_input)
+        self.inputs = list(inputs)
+        for player in self.players:
+            player.move()
+        first, second = self.players
+        if self.finished is False and first.overlaps(*second.bbox):
+            self.strike(first, second)
+            self.strike(second, first)
+        self.timers.advance()
+
+    def save_state(self):  # packs the match into bytes, small enough to keep one for every tick that may be rolled back
+        players = b"".join(player.save_state() for player in self.players)
+        return MATCH_STATE.pack(self.timers.tick, *self.inputs) + players
+
+    def load_state(self, state):  # goes back to a state from save_state
+        tick, first_input, second_input = MATCH_STATE.unpack_from(state)
+        self.inputs = [first_input, second_input]
+        self.timers = main.TimerWheel()  # the players' frame timers are the only timers, they are scheduled again
+        self.timers.tick = tick
+        offset = MATCH_STATE.size
+        for player in self.players:
+            offset = player.load_state(state, offset, self.timers)
+
+
+class RollbackSession:  # plays a match without waiting for the peer's input by predicting it, rolling back when wrong
+    def __init__(self, match, local_index, transport, max_rollback=8):
+        self.match = match
+        self.local_index = local_index  # index of the local player in the match
+        self.transport = transport
+        self.max_rollback = max_rollback  # most ticks played past the peer's last input before waiting for it
+        self.snapshots = [None] * max_rollback  # state before each tick that may be rolled back, indexed by tick
+        self.local_inputs = bytearray()  # local input of every tick played
+        self.remote_inputs = bytearray()  # peer input of every tick up to the first one not yet received
+        self.early_inputs = {}  # peer inputs received out of order, past a gap in remote_inputs
+        self.predictions = {}  # tick: peer input predicted for a tick, checked when the real input arrives
+        self.peer_ack = -1  # last tick of local input the peer has received without a gap
+        self.ticks = 0  # ticks played forwards, re-simulated ticks are not counted
+        self.stalls = 0  # calls of advance that waited as the peer was too far behind
+        self.rollbacks = 0
+        self.resimulated_ticks = 0
+        self.resimulation_time = 0.0
+        self.max_rollback_depth = 0
+        self.packets_sent = 0
+        self.packets_received = 0
+
+    @property
+    def confirmed(self):  # True when every tick played so far used the peer's real input
+        return len(self.remote_inputs) >= self.match.tick
+
+    @property
+    def finished(self):  # the round has ended on a tick that can no longer be rolled back
+        return self.match.finished and self.confirmed
+
+    def advance(self, local_input):  # plays the next tick with the local input, returns False if waiting for the peer
+        self.receive()
+        tick = self.match.tick
+        if tick - len(self.remote_inputs) >= self.max_rollback:  # a correction could need a state older than is kept
+            self.stalls += 1
+            self.send()
+            return False
+        self.local_inputs.append(local_input)
+        self.send()
+        self.simulate(tick)
+        self.ticks += 1
+        return True
+
+    def idle(self):  # takes in and sends inputs without playing a tick, used while waiting or once the round is over
+        self.receive()
+        self.send()
+
+    def simulate(self, tick):  # plays a tick with the peer's input for it, or a prediction when it has not arrived
+        if tick < len(self.remote_inputs):
+            remote_input = self.remote_inputs[tick]
+        elif tick in self.early_inputs:
+            remote_input = self.early_inputs[tick]
+        else:  # players usually hold the same keys from one tick to the next
+            remote_input = self.remote_inputs[-1] if self.remote_inputs else 0
+            self.predictions[tick] = remote_input
+        self.snapshots[tick % self.max_rollback] = self.match.save_state()
+        local_input = self.local_inputs[tick]
+        self.match.step((local_input, remote_input) if self.local_index == 0 else (remote_input, local_input))
+
+    def rollback(self, tick):  # goes back to the state before a mispredicted tick and plays forwards again
+        current_tick = self.match.tick
+        start_time = time.perf_counter()
+        self.match.load_state(self.snapshots[tick % self.max_rollback])
+        for resimulated_tick in range(tick, current_tick):
+            self.simulate(resimulated_tick)
+        self.resimulation_time += time.perf_counter() - start_time
+        self.rollbacks += 1
+        self.resimulated_ticks += current_tick - tick
+        self.max_rollback_depth = max(self.max_rollback_depth, current_tick - tick)
+
+    def receive(self):  # takes in the peer's inputs, rolling back to the first tick that was predicted wrong
+        first_wrong_tick = None
+        for packet in self.transport.receive():
+            self.packets_received += 1
+            first_tick, ack, count = INPUT_PACKET.unpack_from(packet)
+            self.peer_ack = max(self.peer_ack, ack)
+            for tick, remote_input in enumerate(packet[INPUT_PACKET.size:INPUT_PACKET.size + count], first_tick):
+                if tick < len(self.remote_inputs) or tick in self.early_inputs:  # sent again in case it was lost
+                    continue
+                predicted_input = self.predictions.pop(tick, None)
+                if predicted_input is not None and predicted_input != remote_input and \
+                        (first_wrong_tick is None or tick < first_wrong_tick):
+                    first_wrong_tick = tick
+                self.early_inputs[tick] = remote_input
+                while len(self.remote_inputs) in self.early_inputs:
+                    self.remote_inputs.append(self.early_inputs.pop(len(self.remote_inputs)))
+        if first_wrong_tick is not None:
+            self.rollback(first_wrong_tick)
+
+    def send(self):  # sends every local input the peer has not received, so a lost packet is made up for by the next
+        first_tick = self.peer_ack + 1
+        inputs = self.local_inputs[first_tick:first_tick + 255]
+        self.transport.send(INPUT_PACKET.pack(first_tick, len(self.remote_inputs) - 1, len(inputs)) + inputs)
+        self.packets_sent += 1
+
+    def stats(self):
+        ticks = max(self.ticks, 1)
+        snapshots = [snapshot for snapshot in self.snapshots if snapshot is not None]
+        return {"ticks": self.ticks, "stalls": self.stalls, "rollbacks": self.rollbacks,
+                "rollbacks_per_100_ticks": self.rollbacks * 100 / ticks, "resimulated_ticks": self.resimulated_ticks,
+                "resimulated_ticks_per_tick": self.resimulated_ticks / ticks,
+                "resimulation_ms_per_tick": self.resimulation_time * 1000 / ticks,
+                "resimulation_ms_per_rollback": self.resimulation_time * 1000 / max(self.rollbacks, 1),
+                "max_rollback_depth": self.max_rollback_depth, "snapshot_bytes": len(snapshots[0]) if snapshots else 0,
+                "snapshot_buffer_bytes": sum(len(snapshot) for snapshot in snapshots),
+                "packets_sent": self.packets_sent, "packets_received": self.packets_received}
+
+
+class UdpTransport:  # sends packets to the peer over a non-blocking datagram socket
+    def __init__(self, sock, peer=None):
+        self.sock = sock
+        self.sock.setblocking(False)
+        self.peer = peer  # address of the peer, when None it is learnt from the first packet received
+        try:
+            self.sock.getpeername()
+            self.connected = True  # e.g. one end of a socketpair, packets are sent without an address
+        except OSError:
+            self.connected = False
+
+    def send(self, packet):
+        try:
+            if self.connected is True:
+                self.sock.send(packet)
+            elif self.peer is not None:
+                self.sock.sendto(packet, self.peer)
+        except OSError:  # treated as a lost packet, e.g. the peer has not started yet
+            pass
+
+    def receive(self):
+        packets = []
+        while True:
+            try:
+                packet, address = self.sock.recvfrom(1024)
+            except OSError:  # nothing left to read
+                return packets
+            if self.peer is None and self.connected is False:  # the host learns where the joining player is
+                self.peer = address
+            packets.append(packet)
+
+
+class LoopbackLink:  # carries packets between two transports in one process with simulated delay, jitter and loss
+    def __init__(self, delay=5, jitter=2, loss=0.0, seed=None):
+        self.delay = delay  # ticks a packet takes to arrive
+        self.jitter = jitter  # most ticks a packet arrives earlier or later than the delay, packets can be reordered
+        self.loss = loss  # fraction of packets dropped
+        self.random = random.Random(seed)
+        self.tick = 0
+        self.in_flight = []  # heap of arrival tick, send order, transport and packet
+        self.sent = 0
+        self.dropped = 0
+        self.transports = (LoopbackTransport(self, 0), LoopbackTransport(self, 1))
+
+    def send(self, destination, packet):
+        self.sent += 1
+        if self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        arrival = self.tick + max(0, self.delay + self.random.randint(-self.jitter, self.jitter))
+        heapq.heappush(self.in_flight, (arrival, self.sent, destination, packet))
+
+    def advance(self):  # delivers the packets arriving on the next tick
+        self.tick += 1
+        while self.in_flight and self.in_flight[0][0] <= self.tick:
+            arrival, order, destination, packet = heapq.heappop(self.in_flight)
+            self.transports[destination].packets.append(packet)
+
+
+class LoopbackTransport:  # one end of a LoopbackLink
+    def __init__(self, link, index):
+        self.link = link
+        self.index = index
+        self.packets = []  # delivered packets waiting to be received
+
+    def send(self, packet):
+        self.link.send(1 - self.index, bytes(packet))
+
+    def receive(self):
+        packets = self.packets
+        self.packets = []
+        return packets
+
+
+class ScriptedInput:  # inputs of a player pressing keys in a seeded random pattern
+    def __init__(self, seed=None, action_length=40):
+        self.random = random.Random(seed)
+        self.action_length = action_length  # ticks each action lasts for
+        self.action_number = -1
+        self.input = 0
+
+    def input_for(self, tick):  # the same tick always gives the same input, so a stalled tick can be tried again
+        while self.action_number < tick // self.action_length:
+            self.action_number += 1
+            self.input = ACTION_INPUTS[self.random.choice(main.PlayerController.actions)]
+        return self.input
+
+
+def run_loopback(ticks, delay, jitter, loss, max_rollback, seed, action_length):
+    # plays two scripted sessions against each other in this process, returns both sessions and whether they agree
+    link = LoopbackLink(delay, jitter, loss, seed)
+    sessions = [RollbackSession(VersusMatch(create_game(False)), i, link.transports[i], max_rollback) for i in range(2)]
+    scripts = [ScriptedInput(seed * 2 + i if seed is not None else None, action_length) for i in range(2)]
+    while any(session.match.tick < ticks or session.confirmed is False for session in sessions):
+        for session, script in zip(sessions, scripts):
+            if session.match.tick < ticks:
+                session.advance(script.input_for(session.match.tick))
+            else:  # waits for the peer's last inputs, which may roll the final ticks back
+                session.idle()
+        link.advance()
+    states = [session.match.save_state() for session in sessions]
+    return link, sessions, states[0] == states[1]
+
+
+def play_headless(session, ticks, script):  # plays a scripted session against a peer over a socket
+    while session.match.tick < ticks:
+        if session.advance(script.input_for(session.match.tick)) is False:
+            time.sleep(0.001)
+    while session.confirmed is False or session.peer_ack < ticks - 1:  # both sides need every input
+        session.idle()
+        time.sleep(0.001)
+    for i in range(50):  # keeps acknowledging for a while in case the peer's last packets were lost
+        session.idle()
+        time.sleep(0.002)
+
+
+class VersusWindow:  # plays a session in a tkinter window, the local keys go through an InputQueue like Main's
+    max_catch_up_ticks = 5
+
+    def __init__(self, window, session):
+        self.window = window
+        self.session = session
+        game = session.match.game
+        self.canvas = Canvas(window, width=game.canvas_width, height=game.canvas_height, highlightthickness=0)
+        self.canvas.pack()
+        self.view = main.GameView(self.canvas, game)
+        self.status_text = self.canvas.create_text(game.canvas_width / 2, 60, text="", fill="white",
+                                                   font=("Helvetica", 20))
+        self.displayed_status = None
+        self.input_queue = main.InputQueue()
+        for key in main.InputQueue.press_inputs:
+            window.bind('<KeyPress-{}>'.format(key), lambda event: self.input_queue.push(event.keysym, True))
+            window.bind('<KeyRelease-{}>'.format(key), lambda event: self.input_queue.push(event.keysym, False))
+        self.unplayed_input = 0  # keys pressed on ticks spent waiting for the peer, played on the next tick
+        game.display_health_bar()  # shows the local player's health
+        self._accumulator = 0.0
+        self._previous_time = None
+
+    def local_input(self):  # keys held down, and keys pressed and released since the last tick
+        pressed_keys = []
+        self.input_queue.drain(lambda input_type, keysym: pressed_keys.append(keysym)
+                               if input_type != main.INPUT_RELEASE else None)
+        keys = self.input_queue.held_keys.union(pressed_keys)
+        return sum(bit for key, bit in KEY_INPUTS.items() if key in keys)
+
+    def play_tick(self):
+        game = self.session.match.game
+        if self.session.finished is True:
+            self.session.idle()
+        else:
+            local_input = self.local_input() | self.unplayed_input
+            self.unplayed_input = local_input if self.session.advance(local_input) is False else 0
+        game.change_background_image()
+        game.timers.advance()  # the background animates apart from the match
+
+    def status(self):
+        match = self.session.match
+        health = "{} - {}".format(*(player.health for player in match.players))
+        if self.session.finished is False:
+            return health
+        if match.winner is None:
+            return "DRAW " + health
+        return ("YOU WIN " if match.winner == self.session.local_index else "YOU LOSE ") + health
+
+    def process(self):  # plays the ticks that are due then draws a frame, with the same fixed ticks as Main
+        current_time = time.perf_counter()
+        if self._previous_time is None:
+            self._previous_time = current_time - TICK_LENGTH
+        self._accumulator = min(self._accumulator + current_time - self._previous_time,
+                                self.max_catch_up_ticks * TICK_LENGTH)
+        self._previous_time = current_time
+        while self._accumulator >= TICK_LENGTH:
+            self.play_tick()
+            self._accumulator -= TICK_LENGTH
+        match = self.session.match
+        match.game.update_health_bar(match.players[self.session.local_index])
+        status = self.status()
+        if status != self.displayed_status:
+            self.canvas.itemconfigure(self.status_text, text=status)
+            self.displayed_status = status
+        self.view.draw()
+        self.input_queue.frame_drawn(time.perf_counter())
+        self.window.after(max(0, int((TICK_LENGTH - self._accumulator) * 1000)), self.process)
+
+
+def print_stats(name, stats):
+    print("{}: {ticks} TICKS, {rollbacks} ROLLBACKS ({rollbacks_per_100_ticks:.1f}/100 TICKS), "
+          "{resimulated_ticks_per_tick:.2f} RESIMULATED TICKS/TICK, {resimulation_ms_per_tick:.4f}ms/TICK "
+          "RESIMULATING, DEEPEST ROLLBACK {max_rollback_depth} TICKS, {stalls} STALLS".format(name, **stats))
+    print("{}: SNAPSHOTS {snapshot_bytes} BYTES EACH, {snapshot_buffer_bytes} BYTES BUFFERED".format(name, **stats))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="two player versus mode with rollback over UDP")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+    loopback_parser = subparsers.add_parser("loopback", help="plays two scripted players in one process over a "
+                                                             "simulated link and checks both sides agree")
+    loopback_parser.add_argument("--ticks", type=int, default=6000)
+    loopback_parser.add_argument("--delay", type=float, default=50, help="milliseconds a packet takes to arrive")
+    loopback_parser.add_argument("--jitter", type=float, default=20, help="most milliseconds a packet is early or late")
+    loopback_parser.add_argument("--loss", type=float, default=0.0, help="fraction of packets dropped")
+    loopback_parser.add_argument("--seed", type=int, default=0)
+    loopback_parser.add_argument("--action-length", type=int, default=40,
+                                 help="ticks the scripted players hold each action for")
+    for mode_parser in (subparsers.add_parser("host", help="waits for a player to join on the port"),
+                        subparsers.add_parser("join", help="joins a hosted match")):
+        mode_parser.add_argument("--address", default="127.0.0.1", help="address hosted on or joined")
+        mode_parser.add_argument("--port", type=int, default=7777)
+        mode_parser.add_argument("--script", type=int, metavar="SEED",
+                                 help="plays scripted input without a window, prints a checksum of the final state")
+        mode_parser.add_argument("--ticks", type=int, default=6000, help="ticks a scripted match lasts for")
+    for mode_parser in subparsers.choices.values():
+        mode_parser.add_argument("--max-rollback", type=int, default=8, help="most ticks played ahead of the peer")
+    arguments = parser.parse_args()
+    if arguments.mode == "loopback":
+        loopback_link, loopback_sessions, synchronised = run_loopback(
+            arguments.ticks, round(arguments.delay / 1000 / TICK_LENGTH),
+            round(arguments.jitter / 1000 / TICK_LENGTH), arguments.loss, arguments.max_rollback, arguments.seed,
+            arguments.action_length)
+        for session_index, loopback_session in enumerate(loopback_sessions):
+            print_stats("PLAYER {}".format(session_index + 1), loopback_session.stats())
+        print("{} PACKETS SENT, {} DROPPED".format(loopback_link.sent, loopback_link.dropped))
+        print("BOTH SIDES AGREE" if synchronised else "DESYNC: THE SIDES ENDED IN DIFFERENT STATES")
+        sys.exit(0 if synchronised else 1)
+    udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if arguments.mode == "host":
+        udp_socket.bind((arguments.address, arguments.port))
+        udp_transport = UdpTransport(udp_socket)
+    else:
+        udp_transport = UdpTransport(udp_socket, (arguments.address, arguments.port))
+    local_player = 0 if arguments.mode == "host" else 1
+    if arguments.script is not None:
+        versus_session = RollbackSession(VersusMatch(create_game(False)), local_player, udp_transport,
+                                         arguments.max_rollback)
+        play_headless(versus_session, arguments.ticks, ScriptedInput(arguments.script))
+        print_stats("PLAYER {}".format(local_player + 1), versus_session.stats())
+        print("FINAL STATE CHECKSUM {:08x}".format(zlib.crc32(versus_session.match.save_state())))
+    else:
+        window = Tk()
+        window.title("BEAT 'EM UP VERSUS - PLAYER {}".format(local_player + 1))
+        versus_session = RollbackSession(VersusMatch(create_game(True)), local_player, udp_transport,
+                                         arguments.max_rollback)
+        VersusWindow(window, versus_session).process()
+        window.mainloop()